@@ -0,0 +1,132 @@
+"""
+Capacity-aware assignment of population cells to shelters for evacuation planning.
+
+Greedy k-nearest with spill-over: every cell lists its k nearest shelters, all
+(cell, shelter) pairs are taken shortest first, and each moves as many people
+as the cell still has and the shelter can still take. People left over when a
+cell's candidates are full spill into further rounds that only consider
+shelters with room, each round looking four times as far down the list. This
+is not a min-cost flow optimum, but it never sends anyone past a closer shelter
+with room, and it scales to tens of thousands of cells against thousands of
+shelters in a couple of seconds.
+
+Nearest shelters are found with a matrix product of unit vectors (the squared
+chord distance is 2 - 2 * dot) in row chunks, then top_k; only the winners are
+converted to great-circle kilometers.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, top_k
+
+# Cell x shelter dot products held in memory at once
+ALLOCATION_CHUNK_CELLS = 4_000_000
+
+SPILL_ROUNDS = 4
+SPILL_GROWTH = 4
+
+
+class Allocation(NamedTuple):
+    """One row per (cell, shelter) assignment, plus what was left over"""
+    cell: np.ndarray
+    shelter: np.ndarray
+    people: np.ndarray
+    distance_km: np.ndarray
+    unassigned: np.ndarray  # people per cell with no shelter
+    load: np.ndarray        # people per shelter
+
+    @property
+    def person_km(self) -> float:
+        """Total travel distance, summed over every person"""
+        return float(np.dot(self.people, self.distance_km))
+
+    def summary(self) -> Dict:
+        assigned = int(self.people.sum())
+        return {
+            'assigned': assigned,
+            'unassigned': int(self.unassigned.sum()),
+            'person_km': round(self.person_km, 1),
+            'mean_distance_km': round(self.person_km / assigned, 3) if assigned else None,
+            'max_distance_km': round(float(self.distance_km.max()), 3) if len(self.distance_km) else None,
+            'shelters_used': int(np.count_nonzero(self.load)),
+        }
+
+
+def unit_vectors(lats, lons) -> np.ndarray:
+    """N x 3 points on the unit sphere"""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lats)
+    return np.column_stack((cos_lat * np.cos(lons), cos_lat * np.sin(lons), np.sin(lats)))
+
+
+def nearest_pairs(cells: np.ndarray, shelters: np.ndarray, k: int,
+                  max_distance_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (cell, shelter, distance_km) for the k nearest shelters of every cell, given
+    both as unit vectors. Pairs farther than max_distance_km are dropped.
+    """
+    k = min(k, len(shelters))
+    rows = max(1, ALLOCATION_CHUNK_CELLS // max(1, len(shelters)))
+    pair_cells, pair_shelters, pair_distances = [], [], []
+    for start in range(0, len(cells), rows):
+        # Largest dot product = smallest chord = nearest
+        dots = cells[start:start + rows] @ shelters.T
+        nearest = top_k(-dots, k)
+        chord = np.sqrt(np.maximum(2 - 2 * np.take_along_axis(dots, nearest, axis=1), 0))
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+        cell_ids = np.repeat(np.arange(start, start + len(nearest)), k)
+        keep = slice(None) if max_distance_km is None else distances.ravel() <= max_distance_km
+        pair_cells.append(cell_ids[keep])
+        pair_shelters.append(nearest.ravel()[keep])
+        pair_distances.append(distances.ravel()[keep])
+    if not pair_cells:
+        return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0)
+    return np.concatenate(pair_cells), np.concatenate(pair_shelters), np.concatenate(pair_distances)
+
+
+def allocate(cell_lats, cell_lons, population, shelter_lats, shelter_lons, capacity,
+             k: int = 8, max_distance_km: Optional[float] = None) -> Allocation:
+    """
+    Assign population (people per cell) to shelters without exceeding capacity
+    (people per shelter), nearest first. Indices in the result refer to the
+    input order.
+    """
+    cell_points = unit_vectors(cell_lats, cell_lons)
+    shelter_points = unit_vectors(shelter_lats, shelter_lons)
+    need = np.rint(np.asarray(population, dtype=np.float64)).astype(np.int64).tolist()
+    room = np.rint(np.asarray(capacity, dtype=np.float64)).astype(np.int64).tolist()
+
+    rows = []
+    for spill in range(SPILL_ROUNDS):
+        waiting = np.array([i for i, n in enumerate(need) if n > 0], dtype=np.intp)
+        open_shelters = np.array([i for i, n in enumerate(room) if n > 0], dtype=np.intp)
+        if not len(waiting) or not len(open_shelters):
+            break
+
+        depth = min(k * SPILL_GROWTH ** spill, len(open_shelters))
+        cells, shelters, distances = nearest_pairs(cell_points[waiting], shelter_points[open_shelters],
+                                                   depth, max_distance_km)
+        order = np.argsort(distances, kind='stable')
+        cells = waiting[cells[order]].tolist()
+        shelters = open_shelters[shelters[order]].tolist()
+        for cell, shelter, distance in zip(cells, shelters, distances[order].tolist()):
+            people = need[cell]
+            if not people or not room[shelter]:
+                continue
+            moved = min(people, room[shelter])
+            need[cell] -= moved
+            room[shelter] -= moved
+            rows.append((cell, shelter, moved, distance))
+
+        if depth == len(open_shelters):
+            # Every shelter with room was already a candidate; looking further cannot help
+            break
+
+    capacity = np.rint(np.asarray(capacity, dtype=np.float64)).astype(np.int64)
+    if rows:
+        cell, shelter, people, distance = (np.array(column) for column in zip(*rows))
+    else:
+        cell, shelter, people, distance = np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.int64), np.empty(0)
+    return Allocation(cell, shelter, people, distance, np.array(need, dtype=np.int64), capacity - np.array(room, dtype=np.int64))
@@ -0,0 +1,67 @@
+"""
+Throughput of the scalar and vectorized haversine paths and of top-k selection.
+
+    python benchmarks/bench_geo.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import haversine_km, haversine_many, distance_matrix, top_k  # noqa: E402
+
+# Scalar loops get slow quickly; skip them above this many candidates
+SCALAR_LIMIT = 200000
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(label, n, seconds):
+    print(f"  {label:<32} {seconds * 1000:10.2f} ms  {n / seconds / 1e6:8.2f} M/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--matrix', type=int, nargs=2, default=[1000, 1000], metavar=('N', 'M'))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    lat, lon = 13.0827, 80.2707
+
+    for n in args.sizes:
+        lats = rng.uniform(8, 23, n)
+        lons = rng.uniform(68, 92, n)
+        print(f"{n:,} shelter candidates")
+
+        if n <= SCALAR_LIMIT:
+            lat_list, lon_list = lats.tolist(), lons.tolist()
+            report('scalar haversine loop', n, best_of(
+                lambda: [haversine_km(lat, lon, a, b) for a, b in zip(lat_list, lon_list)], repeat=1))
+
+        distances = haversine_many(lat, lon, lats, lons)
+        report('haversine_many', n, best_of(lambda: haversine_many(lat, lon, lats, lons)))
+        report(f'full argsort (k={args.k})', n, best_of(lambda: np.argsort(distances)[:args.k]))
+        report(f'top_k argpartition (k={args.k})', n, best_of(lambda: top_k(distances, args.k)))
+
+    rows, cols = args.matrix
+    lats1, lons1 = rng.uniform(8, 23, rows), rng.uniform(68, 92, rows)
+    lats2, lons2 = rng.uniform(8, 23, cols), rng.uniform(68, 92, cols)
+    print(f"{rows:,} x {cols:,} distance matrix")
+    report('distance_matrix', rows * cols, best_of(lambda: distance_matrix(lats1, lons1, lats2, lons2)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Check that storm_scoring.score_batch matches the scalar scorers point for point,
+then compare their throughput.
+
+    python benchmarks/bench_storm.py --points 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storm_scoring import assess_risk, determine_storm_type, determine_rainfall_type, score_batch  # noqa: E402
+
+
+def make_inputs(n, rng):
+    """Random conditions, with integer humidity/pressure like OpenWeatherMap and values on every threshold"""
+    humidity = rng.integers(30, 101, n)
+    wind_speed = np.round(rng.uniform(0, 40, n), 2)
+    pressure = rng.integers(950, 1040, n)
+    edges = np.array([5, 6, 7, 8, 10, 12, 15, 17, 25])
+    wind_speed[: n // 4] = rng.choice(edges, n // 4)
+    coast = rng.choice(['East Coast', 'West Coast'], n)
+    return humidity, wind_speed, pressure, coast
+
+
+def scalar(humidity, wind_speed, pressure, coast):
+    results = []
+    for h, w, p, c in zip(humidity, wind_speed, pressure, coast):
+        probability, risk_level, alert_color = assess_risk(h, w, p, c)
+        results.append((probability, risk_level, alert_color,
+                        determine_storm_type(h, w, p, c), determine_rainfall_type(h, w)))
+    return results
+
+
+def check(humidity, wind_speed, pressure, coast):
+    expected = scalar(humidity.tolist(), wind_speed.tolist(), pressure.tolist(), coast.tolist())
+    batch = score_batch(humidity, wind_speed, pressure, coast)
+    columns = ('probability', 'risk_level', 'alert_color', 'storm_type', 'rainfall_type')
+    actual_rows = list(zip(*(batch[name].tolist() for name in columns)))
+    for i, (row, actual) in enumerate(zip(expected, actual_rows)):
+        if actual != row:
+            raise SystemExit(f"Mismatch at {i}: inputs={humidity[i], wind_speed[i], pressure[i], coast[i]} "
+                             f"scalar={row} batch={actual}")
+    return len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    humidity, wind_speed, pressure, coast = make_inputs(args.points, rng)
+    print(f"Verified {check(humidity, wind_speed, pressure, coast):,} points: batch matches scalar")
+
+    lists = humidity.tolist(), wind_speed.tolist(), pressure.tolist(), coast.tolist()
+    started = time.perf_counter()
+    scalar(*lists)
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    score_batch(humidity, wind_speed, pressure, coast)
+    batch_seconds = time.perf_counter() - started
+
+    for label, seconds in (('scalar', scalar_seconds), ('score_batch', batch_seconds)):
+        print(f"  {label:<12} {seconds * 1000:10.2f} ms  {args.points / seconds / 1e6:8.2f} M points/s")
+    print(f"  speedup      {scalar_seconds / batch_seconds:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
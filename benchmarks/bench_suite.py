@@ -0,0 +1,268 @@
+"""
+End-to-end and micro benchmarks against replayed upstream fixtures, with a stored baseline.
+
+Starts the stub upstream (benchmarks/stub_server.py) and the app in-process, loads
+every page and per-city API route with concurrent clients, times the hot helpers
+and compares each number with benchmarks/baseline.json, recorded on this
+machine (baselines are not committed: timings from another host mean nothing).
+
+    python benchmarks/bench_suite.py --update-baseline       # record this machine's numbers
+    python benchmarks/bench_suite.py                         # run and flag regressions (exit 1)
+    python benchmarks/bench_suite.py --latency 80 --concurrency 32 --baseline benchmarks/slow.json --update-baseline
+
+App settings (WEATHER_POLL_INTERVAL, RESPONSE_CACHE_SIZE, ...) are read from the environment
+as usual; upstream URLs and storage paths are always pointed at the stub and a
+temporary directory.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import stub_server  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+ROUTES = ('/', '/weather/{city}', '/storm/{city}', '/api/weather/{city}', '/api/shelters/{city}')
+
+
+@contextlib.contextmanager
+def app_output_silenced():
+    """The app logs upstream and cache warnings to stderr; keep them out of the report"""
+    logging.disable(logging.WARNING)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def configure_app(stub_url, workdir):
+    """Point the app at the stub and a scratch directory; must run before newww is imported"""
+    os.environ['OWM_BASE_URL'] = f"{stub_url}/data/2.5"
+    os.environ['OVERPASS_URL'] = f"{stub_url}/api/interpreter"
+    os.environ['SHELTER_STORE_PATH'] = os.path.join(workdir, 'shelters.db')
+    os.environ['SHELTER_INDEX_PATH'] = os.path.join(workdir, 'missing_index.json.gz')
+    os.environ['OBSERVATION_STORE_PATH'] = os.path.join(workdir, 'observations')
+    os.environ.setdefault('OPEN_WEATHER_API_KEY', 'benchmark')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def serve_app(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def load_route(base_url, urls, total, concurrency):
+    """Issue total requests spread over urls from concurrency clients; returns latency stats"""
+    local = threading.local()
+    targets = list(itertools.islice(itertools.cycle(urls), total))
+
+    def fetch(path):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.get(base_url + path, allow_redirects=False)
+        return time.perf_counter() - started, response.status_code < 400
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(fetch, targets))
+        elapsed = time.perf_counter() - started
+
+    latencies = np.array([seconds for seconds, _ in results]) * 1000
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'rps': total / elapsed,
+        'errors': sum(1 for _, ok in results if not ok),
+    }
+
+
+def run_load(newww, base_url, requests_per_route, concurrency):
+    cities = [city.name for city in newww.city_registry]
+    metrics = {}
+    for route in ROUTES:
+        urls = [route.format(city=city) for city in cities] if '{city}' in route else [route]
+        with app_output_silenced():
+            # Warm up caches so the numbers describe steady-state serving
+            for url in urls:
+                requests.get(base_url + url, allow_redirects=False)
+            stats = load_route(base_url, urls, requests_per_route, concurrency)
+        print(f"  {route:<22} p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+              f"{stats['rps']:8.1f} req/s  errors {stats['errors']}")
+        for name in ('p50_ms', 'p99_ms', 'rps'):
+            metrics[f"load {route} {name}"] = stats[name]
+    return metrics
+
+
+def time_per_call(fn, min_seconds=0.2, repeat=3):
+    """Best-of-repeat mean time of fn() in microseconds"""
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        if time.perf_counter() - started >= min_seconds / 10:
+            break
+        calls *= 2
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best * 1e6
+
+
+def run_micro(newww):
+    from allocation import allocate
+    from geo import haversine_km, haversine_many
+    from overpass import iter_json_elements
+    from storm_scoring import score_batch
+
+    city = newww.city_registry.get('Chennai')
+    with app_output_silenced():
+        weather = newww.get_weather(city.name, city.lat, city.lon)
+        forecast = newww.get_forecast(city.name, city.lat, city.lon)
+        newww.get_shelters(city.name, city.lat, city.lon)
+    with open(os.path.join(stub_server.FIXTURES, 'overpass_shelters.json'), 'rb') as f:
+        overpass_body = f.read()
+    chunks = [overpass_body[i:i + 65536] for i in range(0, len(overpass_body), 65536)]
+
+    rng = np.random.default_rng(42)
+    lats, lons = rng.uniform(8, 23, 10000), rng.uniform(68, 92, 10000)
+    humidity, wind, pressure = rng.integers(30, 101, 10000), rng.uniform(0, 40, 10000), rng.integers(950, 1040, 10000)
+    cell_lats, cell_lons, population = rng.uniform(12.9, 13.3, 20000), rng.uniform(80.1, 80.4, 20000), rng.integers(0, 60, 20000)
+    shelter_lats, shelter_lons, capacity = rng.uniform(12.9, 13.3, 2000), rng.uniform(80.1, 80.4, 2000), rng.integers(100, 800, 2000)
+
+    benchmarks = {
+        'get_storm_data': lambda: newww.get_storm_data(city.name, city.coast, weather),
+        'get_storm_data with forecast': lambda: newww.get_storm_data(city.name, city.coast, weather, forecast),
+        'get_shelters (store hit)': lambda: newww.get_shelters(city.name, city.lat, city.lon),
+        'overpass parse + top 12': lambda: newww.shelter_finder.nearest_candidates(
+            city.lat, city.lon, newww.SHELTER_RADIUS_KM, 12, iter_json_elements(chunks)),
+        'haversine_km': lambda: haversine_km(city.lat, city.lon, 13.1, 80.3),
+        'haversine_many x10k': lambda: haversine_many(city.lat, city.lon, lats, lons),
+        'score_batch x10k': lambda: score_batch(humidity, wind, pressure, 'East Coast'),
+        'allocate 20k cells x 2k shelters': lambda: allocate(cell_lats, cell_lons, population,
+                                                             shelter_lats, shelter_lons, capacity),
+    }
+
+    metrics = {}
+    for name, fn in benchmarks.items():
+        with app_output_silenced():
+            micros = time_per_call(fn)
+        print(f"  {name:<30} {micros:12.2f} us")
+        metrics[f"micro {name} us"] = micros
+    return metrics
+
+
+def environment():
+    """Where the numbers were measured; timings are only comparable on the same host and interpreter"""
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'host': platform.node(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_settings(args):
+    return {'requests': args.requests, 'concurrency': args.concurrency, 'latency_ms': args.latency}
+
+
+def compare(metrics, baseline, tolerance):
+    """Names of metrics that got worse than the baseline by more than tolerance"""
+    regressions = []
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = value / base - 1
+        worse = change < -tolerance if name.endswith('rps') else change > tolerance
+        if worse:
+            regressions.append(name)
+            print(f"  REGRESSION {name}: {base:.2f} -> {value:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300, help='Requests per route in the load test')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0, help='Simulated upstream latency in milliseconds')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before flagging (0.25 = 25%%)')
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--skip-micro', action='store_true')
+    args = parser.parse_args()
+
+    stub, stub_url = stub_server.start(latency=args.latency / 1000)
+    workdir = tempfile.mkdtemp(prefix='storm-bench-')
+    configure_app(stub_url, workdir)
+    import newww
+
+    metrics = {}
+    if not args.skip_load:
+        server, base_url = serve_app(newww.app)
+        print(f"Load test: {args.requests} requests per route, concurrency {args.concurrency}, "
+              f"upstream latency {args.latency:g} ms")
+        metrics.update(run_load(newww, base_url, args.requests, args.concurrency))
+        server.shutdown()
+    if not args.skip_micro:
+        print("Microbenchmarks")
+        metrics.update(run_micro(newww))
+    print(f"Upstream requests served by the stub: {stub.stub.requests}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(
+                environment(),
+                recorded_at=time.strftime('%Y-%m-%d %H:%M:%S'),
+                settings=run_settings(args),
+                metrics={name: round(value, 3) for name, value in metrics.items()},
+            ), f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; record one on this machine with --update-baseline first")
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    # Absolute timings from another host or interpreter say nothing about this change
+    current = environment()
+    differs = {key: (baseline.get(key), value) for key, value in current.items() if baseline.get(key) != value}
+    if differs:
+        details = ', '.join(f"{key} {old!r} -> {new!r}" for key, (old, new) in differs.items())
+        sys.exit(f"Baseline was recorded elsewhere ({details}), so its timings are not comparable; "
+                 f"record one on this machine with --update-baseline first")
+    if baseline.get('settings') != run_settings(args):
+        sys.exit(f"Baseline was recorded with {baseline.get('settings')}, not {run_settings(args)}; "
+                 f"rerun with the same --requests, --concurrency and --latency or record a new baseline")
+    regressions = compare(metrics, baseline['metrics'], args.tolerance)
+    if regressions:
+        sys.exit(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+    print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
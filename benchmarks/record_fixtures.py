@@ -0,0 +1,52 @@
+"""
+Record fresh upstream responses for the benchmark stub server.
+
+    OPEN_WEATHER_API_KEY=... python benchmarks/record_fixtures.py --lat 13.0827 --lon 80.2707
+"""
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from overpass import OVERPASS_URL, bbox_around, shelter_query  # noqa: E402
+from stub_server import FIXTURES  # noqa: E402
+
+OWM_BASE_URL = "http://api.openweathermap.org/data/2.5"
+
+
+def save(name, data):
+    path = os.path.join(FIXTURES, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    print(f"Wrote {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lat', type=float, default=13.0827)
+    parser.add_argument('--lon', type=float, default=80.2707)
+    parser.add_argument('--radius', type=float, default=10, help='Shelter search radius in km')
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPEN_WEATHER_API_KEY")
+    if not api_key:
+        sys.exit("OPEN_WEATHER_API_KEY is not set")
+
+    params = {'lat': args.lat, 'lon': args.lon, 'appid': api_key, 'units': 'metric'}
+    for endpoint, name in (('weather', 'owm_weather.json'), ('forecast', 'owm_forecast.json')):
+        response = requests.get(f"{OWM_BASE_URL}/{endpoint}", params=params, timeout=30)
+        response.raise_for_status()
+        save(name, response.json())
+
+    query = shelter_query([bbox_around(args.lat, args.lon, args.radius)])
+    response = requests.post(OVERPASS_URL, data={'data': query}, timeout=120)
+    response.raise_for_status()
+    save('overpass_shelters.json', response.json())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Local stand-in for OpenWeatherMap and Overpass that replays the responses in
+benchmarks/fixtures, moved to the requested coordinates and to the current time
+so every city gets plausible, fresh data.
+
+    python benchmarks/stub_server.py --port 8099 --latency 50
+    OWM_BASE_URL=http://127.0.0.1:8099/data/2.5 OVERPASS_URL=http://127.0.0.1:8099/api/interpreter python newww.py
+
+Refresh the fixtures from the real services with benchmarks/record_fixtures.py.
+"""
+import argparse
+import copy
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+_BBOX = re.compile(r'\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class StubUpstream:
+    """Builds replayed responses; shared by the HTTP handler and in-process callers"""
+
+    def __init__(self):
+        self.weather = load_fixture('owm_weather.json')
+        self.forecast = load_fixture('owm_forecast.json')
+        self.overpass = load_fixture('overpass_shelters.json')
+        self.center = (self.weather['coord']['lat'], self.weather['coord']['lon'])
+        self.requests = 0
+
+    def current(self, lat, lon, city_id=None):
+        data = copy.deepcopy(self.weather)
+        data['coord'] = {'lat': lat, 'lon': lon}
+        # Observations change every 10 minutes, like the real service
+        data['dt'] = int(time.time()) // 600 * 600
+        if city_id is not None:
+            data['id'] = city_id
+        return data
+
+    def group(self, ids):
+        items = [self.current(self.center[0], self.center[1], city_id) for city_id in ids]
+        return {'cnt': len(items), 'list': items}
+
+    def forecast_for(self, lat, lon):
+        data = copy.deepcopy(self.forecast)
+        shift = int(time.time()) // 10800 * 10800 + 10800 - data['list'][0]['dt']
+        for step in data['list']:
+            step['dt'] += shift
+        data['city']['coord'] = {'lat': lat, 'lon': lon}
+        return data
+
+    def shelters(self, query):
+        """Fixture elements moved from the recorded center to the center of the first bbox in the query"""
+        match = _BBOX.search(query)
+        if not match:
+            return self.overpass
+        south, west, north, east = (float(value) for value in match.groups())
+        dlat = (south + north) / 2 - self.center[0]
+        dlon = (west + east) / 2 - self.center[1]
+        data = copy.deepcopy(self.overpass)
+        for element in data['elements']:
+            point = element if element['type'] == 'node' else element.get('center')
+            if point:
+                point['lat'] += dlat
+                point['lon'] += dlon
+        return data
+
+
+def make_handler(stub, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, data, status=200):
+            body = json.dumps(data).encode()
+            time.sleep(latency)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            stub.requests += 1
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path.endswith('/weather'):
+                self.reply(stub.current(float(query['lat']), float(query['lon'])))
+            elif url.path.endswith('/forecast'):
+                self.reply(stub.forecast_for(float(query['lat']), float(query['lon'])))
+            elif url.path.endswith('/group'):
+                self.reply(stub.group([int(city_id) for city_id in query['id'].split(',')]))
+            else:
+                self.reply({'cod': '404', 'message': 'not found'}, 404)
+
+        def do_POST(self):
+            stub.requests += 1
+            length = int(self.headers.get('Content-Length', 0))
+            form = parse_qs(self.rfile.read(length).decode())
+            self.reply(stub.shelters(form.get('data', [''])[0]))
+
+    return Handler
+
+
+def start(port=0, latency=0.0):
+    """Serve the stub on a background thread; returns (server, base_url)"""
+    stub = StubUpstream()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(stub, latency))
+    server.daemon_threads = True
+    server.stub = stub
+    threading.Thread(target=server.serve_forever, name='stub-upstream', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0, help='Added delay per response in milliseconds')
+    args = parser.parse_args()
+
+    server, url = start(args.port, args.latency / 1000)
+    print(f"Stub upstream on {url}")
+    print(f"  OWM_BASE_URL={url}/data/2.5")
+    print(f"  OVERPASS_URL={url}/api/interpreter")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
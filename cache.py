@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'ttl')
+
+    def __init__(self, value: Any, fetched_at: float, ttl: Optional[float] = None):
+        self.value = value
+        self.fetched_at = fetched_at
+        # Overrides the cache's TTL for this value only; dropped with the entry
+        self.ttl = ttl
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-key TTLs, request coalescing and
+    stale-while-revalidate refreshes.
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 256, max_stale: float = 3600,
+                 ttl_overrides: Optional[Dict[Hashable, float]] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self.ttl_overrides = dict(ttl_overrides or {})
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+
+    def set_ttl(self, key: Hashable, ttl: float) -> None:
+        """Override the TTL for a single key"""
+        with self._lock:
+            self.ttl_overrides[key] = ttl
+
+    def ttl_for(self, key: Hashable, entry: Optional[_Entry] = None) -> float:
+        if entry is not None and entry.ttl is not None:
+            return entry.ttl
+        return self.ttl_overrides.get(key, self.ttl)
+
+    def get(self, key: Hashable, loader: Callable[[], Any],
+            entry_ttl: Optional[Callable[[Any], Optional[float]]] = None) -> Any:
+        """
+        Return the cached value for key, calling loader() on a miss.
+
+        Concurrent misses for the same key share one loader call. Once an
+        entry is older than its TTL it is still served (up to max_stale
+        seconds past expiry) while a single background refresh runs.
+        Loaders returning None are treated as failures and never cached;
+        a failed load falls back to the old value only within max_stale,
+        otherwise None is returned.
+        entry_ttl(value), when given, sets a loaded value's own TTL (None
+        keeps the key's usual TTL).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                ttl = self.ttl_for(key, entry)
+                if age < ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                if age < ttl + self.max_stale:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = threading.Event()
+                        threading.Thread(target=self._load, args=(key, loader, entry_ttl), daemon=True).start()
+                    return entry.value
+
+            self.misses += 1
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+
+        if owner:
+            value = self._load(key, loader, entry_ttl)
+            return value if value is not None else self._usable(key)
+
+        event.wait()
+        return self._usable(key)
+
+    def refresh(self, key: Hashable, loader: Callable[[], Any],
+                entry_ttl: Optional[Callable[[Any], Optional[float]]] = None) -> Any:
+        """
+        Force a load of key, joining an in-flight load if there is one.
+        Returns None when the load fails, never the previously cached value.
+        """
+        started = time.monotonic()
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+
+        if owner:
+            return self._load(key, loader, entry_ttl)
+
+        event.wait()
+        with self._lock:
+            entry = self._entries.get(key)
+        # Only a value the joined load stored counts; an older one means it failed
+        return entry.value if entry is not None and entry.fetched_at >= started else None
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value for key, with its own TTL when ttl is given"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def fresh(self, key: Hashable) -> Any:
+        """Return the cached value for key only if it is within its TTL, without loading"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.fetched_at >= self.ttl_for(key, entry):
+                return None
+            return entry.value
+
+    def _usable(self, key: Hashable) -> Any:
+        """The cached value for key while it is within its TTL plus max_stale, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.fetched_at >= self.ttl_for(key, entry) + self.max_stale:
+                return None
+            return entry.value
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the cached value for key regardless of age, without loading"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and the current age of every entry in seconds"""
+        now = time.monotonic()
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                'upstream_loads': self.loads,
+                'load_errors': self.load_errors,
+                'inflight': len(self._inflight),
+                'ages': {str(key): round(now - entry.fetched_at, 1) for key, entry in self._entries.items()},
+            }
+
+    def _load(self, key: Hashable, loader: Callable[[], Any],
+              entry_ttl: Optional[Callable[[Any], Optional[float]]] = None) -> Any:
+        value = None
+        ttl = None
+        try:
+            value = loader()
+            if value is not None and entry_ttl is not None:
+                ttl = entry_ttl(value)
+        except Exception as e:
+            logger.warning("Error loading cache entry %s: %s", key, e)
+            value = None
+        finally:
+            with self._lock:
+                self.loads += 1
+                if value is None:
+                    self.load_errors += 1
+                else:
+                    self._store(key, value, ttl)
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+        return value
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = _Entry(value, time.monotonic(), ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
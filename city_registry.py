@@ -0,0 +1,70 @@
+import csv
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class City(NamedTuple):
+    name: str
+    coast: str
+    lat: float
+    lon: float
+
+
+class CityRegistry:
+    """
+    Every configured city, built once at startup: case-insensitive lookup,
+    per-coast membership and the dropdown list the templates render.
+    Iterating yields City tuples, which unpack as (name, coast, lat, lon).
+    """
+
+    def __init__(self, cities: Iterable[City]):
+        self._cities = []
+        self._by_name = {}
+        for city in cities:
+            key = city.name.lower()
+            if key in self._by_name:
+                logger.warning("Skipping duplicate city %s", city.name)
+                continue
+            self._by_name[key] = city
+            self._cities.append(city)
+
+        by_coast = {}
+        for city in self._cities:
+            by_coast.setdefault(city.coast, []).append(city)
+        self.by_coast: Dict[str, Tuple[City, ...]] = {coast: tuple(members) for coast, members in by_coast.items()}
+        self.dropdown: List[Dict] = [city._asdict() for city in self._cities]
+
+    @classmethod
+    def from_coast_dict(cls, cities: Dict[str, List[Tuple[str, float, float]]],
+                        extra: Iterable[City] = ()) -> 'CityRegistry':
+        """Build from the {coast: [(name, lat, lon), ...]} table plus any extra cities"""
+        builtin = [City(name, coast, lat, lon) for coast, members in cities.items() for name, lat, lon in members]
+        return cls(builtin + list(extra))
+
+    def get(self, name: str) -> Optional[City]:
+        return self._by_name.get(name.lower())
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._by_name
+
+    def __iter__(self) -> Iterator[City]:
+        return iter(self._cities)
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+
+def load_cities(path: str) -> List[City]:
+    """
+    Read cities from a CSV file with name,coast,lat,lon columns, or a JSON list
+    of objects with the same keys.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    return [City(row['name'].strip(), row['coast'].strip(), float(row['lat']), float(row['lon'])) for row in rows]
@@ -0,0 +1,105 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from storm_scoring import RISK_LEVELS, score_batch
+
+# Most timeline entries taken from one forecast, after the "now" entry
+MAX_EVENTS = 5
+
+_SEVERITY = {level: rank for rank, level in enumerate(RISK_LEVELS)}
+
+
+def parse_forecast(data: Dict) -> Optional['Forecast']:
+    """Build a Forecast from an OpenWeatherMap 5 day / 3 hour forecast payload"""
+    steps = data.get('list') or []
+    if not steps:
+        return None
+    return Forecast(
+        ts=[step['dt'] for step in steps],
+        humidity=[step['main']['humidity'] for step in steps],
+        wind_speed=[step['wind']['speed'] for step in steps],
+        pressure=[step['main']['pressure'] for step in steps],
+        rain=[(step.get('rain') or {}).get('3h', 0.0) for step in steps],
+        tz_offset=(data.get('city') or {}).get('timezone', 0),
+    )
+
+
+class Forecast:
+    """
+    One fetched forecast series for a city.
+
+    The series is scored with score_batch and reduced to timeline events the
+    first time a coast asks for it; later calls only drop the events that are
+    already in the past, so serving a timeline costs no scoring and no upstream
+    calls until the next forecast is fetched.
+    """
+
+    def __init__(self, ts, humidity, wind_speed, pressure, rain, tz_offset: int = 0):
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.humidity = np.asarray(humidity, dtype=np.float64)
+        self.wind_speed = np.asarray(wind_speed, dtype=np.float64)
+        self.pressure = np.asarray(pressure, dtype=np.float64)
+        self.rain = np.asarray(rain, dtype=np.float64)
+        self.tz_offset = tz_offset
+        self._events: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return f"{self.ts[0]}-{self.ts[-1]}-{len(self.ts)}"
+
+    def format_time(self, ts: int) -> str:
+        """Local time at the city for a forecast timestamp"""
+        return datetime.fromtimestamp(ts + self.tz_offset, timezone.utc).strftime('%a %H:%M')
+
+    def events(self, coast: str) -> List:
+        """(timestamp, event, rainfall) for the changes in risk across the series, computed once per coast"""
+        events = self._events.get(coast)
+        if events is None:
+            with self._lock:
+                events = self._events.get(coast)
+                if events is None:
+                    events = self._events[coast] = self._compute_events(coast)
+        return events
+
+    def _compute_events(self, coast: str) -> List:
+        scores = score_batch(self.humidity, self.wind_speed, self.pressure, coast)
+        probability = scores['probability']
+        severity = np.array([_SEVERITY[level] for level in scores['risk_level']])
+        peak = int(np.argmax(probability))
+
+        def rainfall(i):
+            return f"{scores['rainfall_type'][i]} · {self.rain[i]:.1f} mm/3h"
+
+        # One event wherever the risk level changes, plus the probability peak
+        changes = set((np.flatnonzero(severity[1:] != severity[:-1]) + 1).tolist())
+        if probability[peak] > probability[0]:
+            changes.add(peak)
+
+        events = []
+        for i in sorted(changes):
+            level = scores['risk_level'][i]
+            if i == peak:
+                event = f"Peak Storm Activity: {scores['storm_type'][i]}"
+            elif severity[i] < severity[i - 1]:
+                event = f"Intensifying ({level} risk)"
+            elif level in ('Low', 'Very Low'):
+                event = f"Clearing Conditions ({level} risk)"
+            else:
+                event = f"Gradual Weakening ({level} risk)"
+            events.append((int(self.ts[i]), event, rainfall(i)))
+
+        if not events:
+            last = len(self.ts) - 1
+            events.append((int(self.ts[last]), f"Stable Conditions ({scores['risk_level'][last]} risk)", rainfall(last)))
+        return events
+
+    def timeline(self, coast: str, now: Optional[float] = None) -> List[Dict]:
+        """Upcoming timeline entries ({'time', 'event', 'rainfall'}), soonest first"""
+        now = time.time() if now is None else now
+        upcoming = [event for event in self.events(coast) if event[0] > now][:MAX_EVENTS]
+        return [{'time': self.format_time(ts), 'event': event, 'rainfall': rain} for ts, event, rain in upcoming]
@@ -0,0 +1,106 @@
+from math import radians, sin, cos, asin, sqrt
+from typing import Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometers"""
+    lat1_rad = radians(lat1)
+    lat2_rad = radians(lat2)
+    delta_lat = radians(lat2 - lat1)
+    delta_lon = radians(lon2 - lon1)
+
+    a = sin(delta_lat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)))
+
+
+def haversine_many(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Distances in km from one point to arrays of points"""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    lat_rad = radians(lat)
+
+    a = np.sin((lats - lat_rad) / 2) ** 2 + cos(lat_rad) * np.cos(lats) * np.sin((lons - radians(lon)) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_matrix(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """N x M matrix of distances in km between two sets of points"""
+    lats1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lons1 = np.radians(np.asarray(lons1, dtype=np.float64))[:, None]
+    lats2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lons2 = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+
+    a = np.sin((lats2 - lats1) / 2) ** 2 + np.cos(lats1) * np.cos(lats2) * np.sin((lons2 - lons1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k smallest distances, closest first, along the last axis.
+    argpartition selects them in O(n); only the k winners are sorted.
+    """
+    distances = np.asarray(distances)
+    n = distances.shape[-1]
+    if k >= n:
+        return np.argsort(distances, axis=-1, kind='stable')
+    if k <= 0:
+        return np.empty(distances.shape[:-1] + (0,), dtype=np.intp)
+    part = np.argpartition(distances, k - 1, axis=-1)[..., :k]
+    order = np.argsort(np.take_along_axis(distances, part, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 6) -> str:
+    """Geohash of a point; precision 6 cells are roughly 1.2 km x 0.6 km"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at precision"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """Center (lat, lon) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
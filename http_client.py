@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyHistogram
+
+# Status codes worth retrying: rate limiting and transient gateway errors
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures, then lets a single
+    trial request through once reset_timeout seconds have passed.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    HTTP client for one upstream: shared keep-alive pool, connect/read timeouts,
+    bounded retries with jittered exponential backoff and a circuit breaker.
+    """
+
+    def __init__(self, name: str, session: requests.Session, timeout: Tuple[float, float] = (3.05, 10),
+                 retries: int = 2, backoff: float = 0.25, backoff_max: float = 2.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.session = session
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            self.requests += 1
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.latency.observe(time.monotonic() - started)
+                self.errors += 1
+                if attempt >= self.retries:
+                    self.breaker.record_failure()
+                    raise
+            except Exception:
+                # Not worth retrying (bad encoding, redirect loop, ...), but a half-open trial must still
+                # record an outcome or the breaker would never leave half_open
+                self.latency.observe(time.monotonic() - started)
+                self.errors += 1
+                self.breaker.record_failure()
+                raise
+            else:
+                self.latency.observe(time.monotonic() - started)
+                if response.status_code not in RETRY_STATUSES and response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self.errors += 1
+                if attempt >= self.retries:
+                    self.breaker.record_failure()
+                    return response
+                response.close()
+
+            # Full jitter keeps retrying workers from hitting the upstream in lockstep
+            self.retried += 1
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retried': self.retried,
+            'rejected': self.rejected,
+            'circuit': self.breaker.state,
+            'timeout': list(self.timeout),
+            'latency': self.latency.snapshot()
+        }
+
+
+def create_session(pool_maxsize: int = 32) -> requests.Session:
+    """requests.Session with a keep-alive pool large enough for concurrent fetches"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# One pooled session shared by every upstream
+session = create_session()
+
+openweathermap = UpstreamClient('openweathermap', session, timeout=(3.05, 10), retries=2)
+overpass = UpstreamClient('overpass', session, timeout=(3.05, 30), retries=1,
+                          breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+upstreams = {client.name: client for client in (openweathermap, overpass)}
+
+
+def stats() -> Dict:
+    """Per-upstream counters, circuit state and latency histograms"""
+    return {name: client.stats() for name, client in upstreams.items()}
@@ -0,0 +1,240 @@
+"""
+In-process metrics in the Prometheus text format, plus an optional sampling profiler.
+
+    with metrics.timed('storm_render_seconds', template='storm.html'):
+        ...
+    metrics.inc('storm_errors_total', source='overpass')
+
+Histograms and counters are created on first use. Components that already keep
+their own counters (caches, upstream clients) are exported through collectors
+registered with registry.add_collector, so nothing is counted twice.
+"""
+import collections
+import contextlib
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Latency histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+                seen += n
+                if seen >= rank:
+                    return bound
+        return float('inf')
+
+    def cumulative(self) -> Tuple[list, int, float]:
+        """([(upper bound, observations <= bound), ...], count, sum), read atomically"""
+        with self._lock:
+            running = 0
+            buckets = []
+            for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+                running += n
+                buckets.append((bound, running))
+            return buckets, self.count, self.total
+
+    def snapshot(self) -> Dict:
+        p50, p99 = self.quantile(0.5), self.quantile(0.99)
+        with self._lock:
+            return {
+                'count': self.count,
+                'sum': round(self.total, 4),
+                'buckets': {str(bound): n for bound, n in zip(self.buckets + ('+Inf',), self.counts)},
+                'p50': p50,
+                'p99': p99
+            }
+
+
+# A collector yields (kind, name, labels, value); kind is 'counter', 'gauge' or 'histogram'
+# (value is then a LatencyHistogram)
+Collector = Callable[[], Iterable[Tuple[str, str, Dict, object]]]
+
+
+def _labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+        for key, value in sorted(labels.items())
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Named, labelled histograms and counters rendered as Prometheus text"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, tuple], LatencyHistogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, **labels) -> LatencyHistogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        self.histogram(name, **labels).observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timed(self, name: str, **labels):
+        """Time a block (or, as a decorator, each call) into the histogram name{labels}"""
+        histogram = self.histogram(name, **labels)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def samples(self):
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        for (name, labels), value in counters:
+            yield 'counter', name, dict(labels), value
+        for (name, labels), histogram in histograms:
+            yield 'histogram', name, dict(labels), histogram
+        for collector in self._collectors:
+            yield from collector()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        by_name = collections.OrderedDict()
+        for kind, name, labels, value in self.samples():
+            by_name.setdefault((name, kind), []).append((labels, value))
+
+        lines = []
+        for (name, kind), samples in by_name.items():
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                buckets, count, total = value.cumulative()
+                for bound, n in buckets:
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le=_number(bound)))} {n}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that can be switched on in a running process.
+
+    A background thread snapshots every other thread's stack each interval
+    seconds and counts the collapsed stacks, which report() returns in the
+    folded format flame graph tools read ("outer;inner;leaf count").
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 48, max_stacks: int = 20000):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self.started_at = None
+        self._stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stacks.clear()
+            self.samples = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                with self._lock:
+                    if key in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[key] += 1
+            self.samples += 1
+
+    def report(self, limit: Optional[int] = None) -> str:
+        """Collapsed stacks, most frequent first"""
+        # The sampler keeps inserting while a report is requested
+        with self._lock:
+            stacks = self._stacks.copy()
+        return '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common(limit)) + '\n'
+
+
+# Process-wide registry and profiler used by the app
+registry = Registry()
+profiler = SamplingProfiler()
+
+histogram = registry.histogram
+observe = registry.observe
+inc = registry.inc
+timed = registry.timed
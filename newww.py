@@ -1,21 +1,124 @@
-from flask import Flask, render_template, jsonify, redirect, url_for
-import requests
+from flask import Flask, render_template, jsonify, redirect, url_for, request, Response, g, abort
+from concurrent.futures import ThreadPoolExecutor
+import click
+import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from shelter_finder import ShelterFinder
-from math import radians, sin, cos, sqrt, atan2
+from shelter_finder import ShelterFinder, capacity_range
+from allocation import allocate
+from cache import TTLCache
+from city_registry import CityRegistry, load_cities
+from shelter_store import ShelterStore
+from observation_store import ObservationStore
+from storm_scoring import assess_risk, determine_storm_type, determine_rainfall_type, RECOMMENDATIONS
+from spatial_index import ShelterIndex, download_index
+from overpass import plan_queries
+import http_client
+import metrics
+from weather_poller import WeatherPoller
+from forecast import parse_forecast
+from storm_stream import StormBroadcaster, weather_version
+from response_cache import ResponseCache, make_version
+from snapshot_store import SharedSnapshotStore, SnapshotReader
+from risk_grid import CATEGORY_LEVELS, PALETTE, RiskGrid, build_grid, grid_bounds, tile_in_range
+from geo import haversine_km, haversine_many, top_k, geohash_encode, geohash_decode, geohash_cell_size
 from dotenv import load_dotenv
+import numpy as np
 import os
 
 app = Flask(__name__)
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
 # OpenWeatherMap API Key
 API_KEY = os.getenv("OPEN_WEATHER_API_KEY")
+OWM_BASE_URL = os.getenv("OWM_BASE_URL", "http://api.openweathermap.org/data/2.5")
+
+# Worker pool for multi-city requests
+bulk_executor = ThreadPoolExecutor(max_workers=int(os.getenv("BULK_FETCH_WORKERS", "18")), thread_name_prefix='bulk-fetch')
+
+# Initialize shelter finder, answering from the offline shelter index when one has been built
+SHELTER_INDEX_PATH = os.getenv("SHELTER_INDEX_PATH", "shelter_index.json.gz")
+shelter_index = ShelterIndex.load(SHELTER_INDEX_PATH) if os.path.exists(SHELTER_INDEX_PATH) else None
+# Written by refresh-shelters; only covers the search radius around each city
+CITY_SHELTER_INDEX_PATH = os.getenv("CITY_SHELTER_INDEX_PATH", "city_shelter_index.json.gz")
+shelter_finder = ShelterFinder(client=http_client.overpass, index=shelter_index)
+
+# Persistent shelter cache shared by every worker process (reduces Overpass calls)
+SHELTER_RADIUS_KM = 10
+SHELTER_EMPTY_TTL = 600
+# Seconds before an expired shelter entry whose refresh failed is tried again
+SHELTER_REFRESH_BACKOFF = 300
+shelter_store = ShelterStore(
+    os.getenv("SHELTER_STORE_PATH", "shelters.db"),
+    ttl=int(os.getenv("SHELTER_STORE_TTL", str(7 * 24 * 3600)))
+)
+
+# Nearest-shelter candidates for arbitrary coordinates, cached per geohash cell so nearby users share entries.
+# Precision 5 cells (~4.9 km) are small next to the 50 km search radius, so one lookup serves a whole cell;
+# where a cell's candidates cannot answer a point exactly, finer cells (down to precision 7, ~150 m) are tried.
+NEAREST_GEOHASH_PRECISION = 5
+NEAREST_MAX_PRECISION = 7
+NEAREST_MAX_K = 20
+NEAREST_RADIUS_KM = 50
+NEAREST_CELL_MAX_CANDIDATES = 1000
+nearest_cache = TTLCache(ttl=int(os.getenv("NEAREST_CACHE_TTL", "3600")), max_entries=2000)
+
+# Evacuation allocation limits; shelters are searched this far beyond the outermost population cell
+ALLOCATION_MAX_CELLS = int(os.getenv("ALLOCATION_MAX_CELLS", "100000"))
+ALLOCATION_MAX_SHELTERS = 10000
+ALLOCATION_SEARCH_MARGIN_KM = 10
+# Widest live Overpass search for shelters around the cells; larger areas need the offline index or explicit shelters
+ALLOCATION_MAX_SEARCH_RADIUS_KM = int(os.getenv("ALLOCATION_MAX_SEARCH_RADIUS_KM", "50"))
+CAPACITY_BOUNDS = {'min': 0, 'max': 1}
+
+# Cache for weather data: one upstream call per city per TTL, shared by all routes.
+# Use weather_cache.set_ttl(city, seconds) to refresh a city more or less often.
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+weather_cache = TTLCache(ttl=WEATHER_CACHE_TTL, max_entries=256)
+
+# 5 day / 3 hour forecasts behind the storm timeline, fetched at most once per city per TTL
+FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "3600"))
+forecast_cache = TTLCache(ttl=FORECAST_CACHE_TTL, max_entries=256)
+
+# Append-only history of every weather observation fetched, for trends and charts (empty path disables)
+OBSERVATION_STORE_PATH = os.getenv("OBSERVATION_STORE_PATH", "observations")
+observation_store = ObservationStore(OBSERVATION_STORE_PATH) if OBSERVATION_STORE_PATH else None
+HISTORY_MAX_HOURS = 24 * 365
+
+# Host-wide snapshots in shared memory, written by `flask --app newww snapshot-refresher`;
+# when set, every worker serves weather, storm and shelters from it instead of fetching its own
+SNAPSHOT_SHM_NAME = os.getenv("SNAPSHOT_SHM_NAME")
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "900"))
+snapshot_reader = SnapshotReader(SNAPSHOT_SHM_NAME, max_age=SNAPSHOT_MAX_AGE) if SNAPSHOT_SHM_NAME else None
 
-# Initialize shelter finder
-shelter_finder = ShelterFinder()
+# Runtime-switchable sampling profiler endpoints under /debug/profiler (off unless enabled)
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
 
-# Cache for shelter data (reduces API calls)
-shelter_cache = {}
+# Rendered pages and API bodies, reused (and compressed once) until their snapshot version changes
+response_cache = ResponseCache(max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "512")))
+TEMPLATE_VERSION = make_version(*sorted(
+    (name, os.path.getmtime(os.path.join(app.root_path, app.template_folder, name)))
+    for name in os.listdir(os.path.join(app.root_path, app.template_folder))
+))
+
+# Region-wide risk grid interpolated from the city observations, rebuilt once per weather refresh
+RISK_GRID_STEP = float(os.getenv("RISK_GRID_STEP", "0.05"))
+RISK_GRID_MAX_DISTANCE_KM = float(os.getenv("RISK_GRID_MAX_DISTANCE_KM", "150"))
+RISK_GRID_MARGIN = 1.5
+RISK_TILE_MAX_ZOOM = 12
+tile_cache = ResponseCache(max_entries=int(os.getenv("RISK_TILE_CACHE_SIZE", "4096")))
+risk_grid = None
+risk_grid_lock = threading.Lock()
+risk_grid_builder = None
+
+# Optional background poller that pre-computes weather and storm snapshots (0 disables)
+WEATHER_POLL_INTERVAL = int(os.getenv("WEATHER_POLL_INTERVAL", "0"))
+WEATHER_POLL_MODE = os.getenv("WEATHER_POLL_MODE", "thread")
+# Poller snapshots older than this are ignored (default: three poll intervals)
+WEATHER_POLL_MAX_AGE = int(os.getenv("WEATHER_POLL_MAX_AGE", str(3 * WEATHER_POLL_INTERVAL)))
 
 # Coastal cities with coordinates
 cities = {
@@ -43,155 +146,166 @@ cities = {
     ]
 }
 
+# Registry of every city, built once: the table above plus any towns listed in CITY_DATA_PATH
+CITY_DATA_PATH = os.getenv("CITY_DATA_PATH")
+city_registry = CityRegistry.from_coast_dict(cities, load_cities(CITY_DATA_PATH) if CITY_DATA_PATH else ())
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in km
-    
-    lat1_rad = radians(lat1)
-    lat2_rad = radians(lat2)
-    delta_lat = radians(lat2 - lat1)
-    delta_lon = radians(lon2 - lon1)
-    
-    a = sin(delta_lat/2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    
-    return round(R * c, 2)
+    return round(haversine_km(lat1, lon1, lat2, lon2), 2)
+
+# Optional OpenWeatherMap city IDs. Cities listed here are fetched in batched
+# group queries by the multi-city endpoint; the rest are fetched concurrently.
+city_ids = {}
+
+OWM_GROUP_LIMIT = 20
+
+def parse_weather(city, lat, lon, data):
+    """Convert an OpenWeatherMap current-weather payload into our weather dict"""
+    main = data['main']
+    weather = data['weather'][0]
+    wind = data['wind']
+    return {
+        'city': city,
+        'temp': round(main['temp']),
+        'feels_like': round(main['feels_like']),
+        'temp_min': round(main['temp_min']),
+        'temp_max': round(main['temp_max']),
+        'humidity': main['humidity'],
+        'pressure': main['pressure'],
+        'wind_speed': wind['speed'],
+        'wind_deg': wind.get('deg', 0),
+        'visibility': data.get('visibility', 0) / 1000,
+        'condition': weather['description'],
+        'icon': weather['icon'],
+        'main': weather['main'],
+        'lat': lat,
+        'lon': lon,
+        'observed_at': data.get('dt')
+    }
+
+def record_observation(weather):
+    """Append a fetched observation to the history store; repeats of the same observation are ignored"""
+    if observation_store is None:
+        return
+    try:
+        observation_store.append(weather['city'], weather)
+    except Exception as e:
+        metrics.inc('storm_errors_total', source='observation_store')
+        logger.warning("Error recording observation for %s: %s", weather['city'], e)
 
 def fetch_weather(city, lat, lon):
-    url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
+    url = f"{OWM_BASE_URL}/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
     try:
-        response = requests.get(url)
+        response = http_client.openweathermap.get(url)
         data = response.json()
         if data['cod'] == 200:
-            main = data['main']
-            weather = data['weather'][0]
-            wind = data['wind']
-            return {
-                'city': city,
-                'temp': round(main['temp']),
-                'feels_like': round(main['feels_like']),
-                'temp_min': round(main['temp_min']),
-                'temp_max': round(main['temp_max']),
-                'humidity': main['humidity'],
-                'pressure': main['pressure'],
-                'wind_speed': wind['speed'],
-                'wind_deg': wind.get('deg', 0),
-                'visibility': data.get('visibility', 0) / 1000,
-                'condition': weather['description'],
-                'icon': weather['icon'],
-                'main': weather['main'],
-                'lat': lat,
-                'lon': lon
-            }
+            weather = parse_weather(city, lat, lon, data)
+            record_observation(weather)
+            return weather
     except Exception as e:
-        print(f"Error fetching weather for {city}: {e}")
+        metrics.inc('storm_errors_total', source='openweathermap')
+        logger.warning("Error fetching weather for %s: %s", city, e)
     return None
 
-def determine_storm_type(humidity, wind_speed, pressure, coast):
-    """Determine the type of storm based on conditions"""
-    if wind_speed > 25 and pressure < 990:
-        return "Severe Cyclonic Storm"
-    elif wind_speed > 17 and pressure < 1000:
-        return "Tropical Storm"
-    elif wind_speed > 12 and humidity > 85:
-        return "Thunderstorm with Heavy Rain"
-    elif humidity > 80 and wind_speed > 8:
-        return "Moderate Thunderstorm"
-    else:
-        return "Light Rain Showers"
-
-def determine_rainfall_type(humidity, wind_speed):
-    """Determine rainfall intensity"""
-    if humidity > 90 and wind_speed > 15:
-        return "Heavy to Very Heavy Rain (115-204 mm)"
-    elif humidity > 85 and wind_speed > 10:
-        return "Heavy Rain (64.5-115.5 mm)"
-    elif humidity > 75 and wind_speed > 7:
-        return "Moderate Rain (35.5-64.4 mm)"
-    elif humidity > 65:
-        return "Light Rain (2.5-15.5 mm)"
-    else:
-        return "Very Light Rain (<2.5 mm)"
+def fetch_weather_group(locations):
+    """Fetch weather for (city, lat, lon, city_id) tuples with OpenWeatherMap group queries"""
+    results = {}
+    for i in range(0, len(locations), OWM_GROUP_LIMIT):
+        batch = locations[i:i + OWM_GROUP_LIMIT]
+        by_id = {city_id: (city, lat, lon) for city, lat, lon, city_id in batch}
+        ids = ','.join(str(city_id) for city_id in by_id)
+        url = f"{OWM_BASE_URL}/group?id={ids}&appid={API_KEY}&units=metric"
+        try:
+            data = http_client.openweathermap.get(url).json()
+            for item in data.get('list', []):
+                if item.get('id') in by_id:
+                    city, lat, lon = by_id[item['id']]
+                    results[city] = parse_weather(city, lat, lon, item)
+                    record_observation(results[city])
+        except Exception as e:
+            metrics.inc('storm_errors_total', source='openweathermap')
+            logger.warning("Error fetching weather group %s: %s", ids, e)
+    return results
 
-def get_storm_data(city, coast, weather):
+def get_weather(city, lat, lon):
+    """Cached wrapper around fetch_weather; the returned dict is shared, copy before modifying"""
+    with metrics.timed('storm_cache_lookup_seconds', cache='weather'):
+        return weather_cache.get(city, lambda: fetch_weather(city, lat, lon))
+
+def fetch_forecast(city, lat, lon):
+    url = f"{OWM_BASE_URL}/forecast?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
+    try:
+        data = http_client.openweathermap.get(url).json()
+        if str(data.get('cod')) == '200':
+            return parse_forecast(data)
+    except Exception as e:
+        metrics.inc('storm_errors_total', source='openweathermap')
+        logger.warning("Error fetching forecast for %s: %s", city, e)
+    return None
+
+def get_forecast(city, lat, lon):
+    """Cached Forecast for a city, or None if the forecast is unavailable"""
+    with metrics.timed('storm_cache_lookup_seconds', cache='forecast'):
+        return forecast_cache.get(city, lambda: fetch_forecast(city, lat, lon))
+
+# Fallback timeline templates by probability bucket, used when no forecast is available: (minimum probability, [(hours from now, event, rainfall)]).
+# An event/rainfall of None is filled in with the current storm type/rainfall.
+STORM_TIMELINES = [
+    (70, [
+        (0, None, None),
+        (3, 'Peak Storm Activity', 'Extremely Heavy Rain (>205 mm)'),
+        (6, 'Gradual Weakening', 'Heavy Rain (64.5-115.5 mm)'),
+        (12, 'Storm Subsiding', 'Moderate Rain (35.5-64.4 mm)'),
+        (24, 'Clear Conditions Expected', 'Light Drizzle')
+    ]),
+    (45, [
+        (0, None, None),
+        (2, 'Intensifying Conditions', 'Heavy Rain (64.5-115.5 mm)'),
+        (6, 'Peak Wind Activity', 'Moderate to Heavy Rain'),
+        (12, 'Conditions Improving', 'Light Rain (2.5-15.5 mm)'),
+        (18, 'Clearing Up', 'Scattered Showers')
+    ]),
+    (25, [
+        (0, None, None),
+        (3, 'Possible Thunderstorms', 'Moderate Rain (35.5-64.4 mm)'),
+        (8, 'Weather Stabilizing', 'Light Rain (2.5-15.5 mm)'),
+        (16, 'Mostly Clear', 'Isolated Showers')
+    ]),
+    (None, [
+        (0, 'Calm Conditions', 'No Significant Rain'),
+        (6, 'Partly Cloudy', 'Very Light Rain (<2.5 mm)'),
+        (12, 'Stable Weather', 'No Rain Expected'),
+        (24, 'Clear Skies', 'Dry Conditions')
+    ])
+]
+
+@metrics.timed('storm_scoring_seconds')
+def get_storm_data(city, coast, weather, forecast=None):
     humidity = weather['humidity']
     wind_speed = weather['wind_speed']
     pressure = weather['pressure']
     
     # Calculate storm probability
-    probability = 0
-    
-    if coast == 'East Coast':
-        if humidity >= 85 and wind_speed >= 12:
-            probability = min(95, int(humidity * 0.6 + wind_speed * 3.5 + (1010 - pressure) * 0.5))
-            risk_level = 'Critical'
-            alert_color = '#dc2626'
-        elif humidity >= 75 and wind_speed >= 8:
-            probability = min(70, int(humidity * 0.4 + wind_speed * 2.5))
-            risk_level = 'High'
-            alert_color = '#ef4444'
-        elif humidity >= 65 and wind_speed >= 5:
-            probability = min(45, int(humidity * 0.3 + wind_speed * 1.5))
-            risk_level = 'Moderate'
-            alert_color = '#f97316'
-        else:
-            probability = min(25, int(humidity * 0.2 + wind_speed * 0.8))
-            risk_level = 'Low'
-            alert_color = '#10b981'
-    else:  # West Coast
-        if humidity >= 90 and wind_speed >= 15:
-            probability = min(85, int(humidity * 0.5 + wind_speed * 3 + (1010 - pressure) * 0.4))
-            risk_level = 'High'
-            alert_color = '#ef4444'
-        elif humidity >= 80 and wind_speed >= 10:
-            probability = min(60, int(humidity * 0.35 + wind_speed * 2))
-            risk_level = 'Moderate'
-            alert_color = '#f97316'
-        elif humidity >= 70 and wind_speed >= 6:
-            probability = min(35, int(humidity * 0.25 + wind_speed * 1.2))
-            risk_level = 'Low'
-            alert_color = '#eab308'
-        else:
-            probability = min(15, int(humidity * 0.15 + wind_speed * 0.5))
-            risk_level = 'Very Low'
-            alert_color = '#10b981'
+    probability, risk_level, alert_color = assess_risk(humidity, wind_speed, pressure, coast)
 
     storm_type = determine_storm_type(humidity, wind_speed, pressure, coast)
     rainfall_type = determine_rainfall_type(humidity, wind_speed)
     
-    # Generate timeline
+    # Generate timeline from the forecast when there is one, otherwise from the templates
     now = datetime.now()
-    timeline = []
-    
-    if probability > 70:
-        timeline = [
-            {'time': now.strftime('%H:%M'), 'event': f'{storm_type}', 'rainfall': rainfall_type},
-            {'time': (now + timedelta(hours=3)).strftime('%H:%M'), 'event': 'Peak Storm Activity', 'rainfall': 'Extremely Heavy Rain (>205 mm)'},
-            {'time': (now + timedelta(hours=6)).strftime('%H:%M'), 'event': 'Gradual Weakening', 'rainfall': 'Heavy Rain (64.5-115.5 mm)'},
-            {'time': (now + timedelta(hours=12)).strftime('%H:%M'), 'event': 'Storm Subsiding', 'rainfall': 'Moderate Rain (35.5-64.4 mm)'},
-            {'time': (now + timedelta(hours=24)).strftime('%H:%M'), 'event': 'Clear Conditions Expected', 'rainfall': 'Light Drizzle'}
-        ]
-    elif probability > 45:
-        timeline = [
-            {'time': now.strftime('%H:%M'), 'event': f'{storm_type}', 'rainfall': rainfall_type},
-            {'time': (now + timedelta(hours=2)).strftime('%H:%M'), 'event': 'Intensifying Conditions', 'rainfall': 'Heavy Rain (64.5-115.5 mm)'},
-            {'time': (now + timedelta(hours=6)).strftime('%H:%M'), 'event': 'Peak Wind Activity', 'rainfall': 'Moderate to Heavy Rain'},
-            {'time': (now + timedelta(hours=12)).strftime('%H:%M'), 'event': 'Conditions Improving', 'rainfall': 'Light Rain (2.5-15.5 mm)'},
-            {'time': (now + timedelta(hours=18)).strftime('%H:%M'), 'event': 'Clearing Up', 'rainfall': 'Scattered Showers'}
-        ]
-    elif probability > 25:
-        timeline = [
-            {'time': now.strftime('%H:%M'), 'event': f'{storm_type}', 'rainfall': rainfall_type},
-            {'time': (now + timedelta(hours=3)).strftime('%H:%M'), 'event': 'Possible Thunderstorms', 'rainfall': 'Moderate Rain (35.5-64.4 mm)'},
-            {'time': (now + timedelta(hours=8)).strftime('%H:%M'), 'event': 'Weather Stabilizing', 'rainfall': 'Light Rain (2.5-15.5 mm)'},
-            {'time': (now + timedelta(hours=16)).strftime('%H:%M'), 'event': 'Mostly Clear', 'rainfall': 'Isolated Showers'}
-        ]
+    upcoming = forecast.timeline(coast) if forecast else []
+    if upcoming:
+        timeline = [{'time': 'Now', 'event': storm_type, 'rainfall': rainfall_type}] + upcoming
     else:
+        steps = next(steps for threshold, steps in STORM_TIMELINES if threshold is None or probability > threshold)
         timeline = [
-            {'time': now.strftime('%H:%M'), 'event': 'Calm Conditions', 'rainfall': 'No Significant Rain'},
-            {'time': (now + timedelta(hours=6)).strftime('%H:%M'), 'event': 'Partly Cloudy', 'rainfall': 'Very Light Rain (<2.5 mm)'},
-            {'time': (now + timedelta(hours=12)).strftime('%H:%M'), 'event': 'Stable Weather', 'rainfall': 'No Rain Expected'},
-            {'time': (now + timedelta(hours=24)).strftime('%H:%M'), 'event': 'Clear Skies', 'rainfall': 'Dry Conditions'}
+            {
+                'time': (now + timedelta(hours=hours)).strftime('%H:%M'),
+                'event': event or storm_type,
+                'rainfall': rainfall or rainfall_type
+            }
+            for hours, event, rainfall in steps
         ]
 
     factors = [
@@ -203,14 +317,6 @@ def get_storm_data(city, coast, weather):
         f"Expected Rainfall: {rainfall_type}"
     ]
 
-    recommendations = {
-        'Critical': 'URGENT: Evacuate coastal areas immediately. Seek shelter inland. Avoid all travel. Severe storm conditions imminent.',
-        'High': 'Secure all loose objects, avoid coastal areas and sea travel. Stay indoors and monitor emergency updates continuously.',
-        'Moderate': 'Stay alert and avoid unnecessary travel near coast. Keep emergency supplies ready. Monitor weather updates.',
-        'Low': 'Normal precautions. Keep umbrella handy. Avoid prolonged exposure to rain.',
-        'Very Low': 'No significant precautions needed. Enjoy your day with minimal weather concerns.'
-    }
-
     return {
         'risk_level': risk_level,
         'alert_color': alert_color,
@@ -218,128 +324,812 @@ def get_storm_data(city, coast, weather):
         'storm_type': storm_type,
         'rainfall_type': rainfall_type,
         'wind_info': 'Strong onshore flow' if coast == 'East Coast' else 'Moderate sea breeze',
-        'recommendation': recommendations.get(risk_level, recommendations['Low']),
+        'recommendation': RECOMMENDATIONS.get(risk_level, RECOMMENDATIONS['Low']),
         'timeline': timeline,
         'factors': factors
     }
 
-def get_shelters(city_name, lat, lon):
-    """Get top 4-5 nearest shelters for a city with caching"""
-    cache_key = f"{city_name}_{lat:.4f}_{lon:.4f}"
+def fetch_shelters(lat, lon):
+    """Query Overpass for the 5 nearest shelters to a point"""
+    shelters = shelter_finder.get_shelters_near_location(lat, lon, radius_km=SHELTER_RADIUS_KM)
+    if not shelters:
+        return []
     
-    if cache_key in shelter_cache:
-        print(f"Using cached shelters for {city_name}")
-        return shelter_cache[cache_key]
+    # Distances from city center for selection only - they are calculated client-side for display
+    distances = haversine_many(lat, lon, [s['lat'] for s in shelters], [s['lon'] for s in shelters])
+    shelters_sorted = [shelters[i] for i in top_k(distances, 5)]
     
-    print(f"Fetching shelters for {city_name}...")
+    for shelter in shelters_sorted:
+        del shelter['distance']
+    
+    return shelters_sorted
+
+def get_shelters(city_name, lat, lon, refresh=False):
+    """
+    Get top 4-5 nearest shelters for a city from the persistent shelter store.
+    Expired entries are served as they are while one background refresh runs.
+    """
+    with metrics.timed('storm_cache_lookup_seconds', cache='shelter_store'):
+        entry = shelter_store.get_entry(lat, lon, SHELTER_RADIUS_KM)
+    if entry and not refresh:
+        if not entry[2]:
+            metrics.inc('storm_shelter_store_lookups_total', result='hit')
+            logger.debug("Using cached shelters for %s", city_name)
+            return entry[0]
+        metrics.inc('storm_shelter_store_lookups_total', result='stale')
+        # Only the worker that re-stamps the entry refreshes it; everyone else keeps serving it
+        if shelter_store.claim_refresh(lat, lon, SHELTER_RADIUS_KM, SHELTER_REFRESH_BACKOFF):
+            bulk_executor.submit(load_shelters, city_name, lat, lon, entry)
+        return entry[0]
+    
+    if not entry:
+        metrics.inc('storm_shelter_store_lookups_total', result='miss')
+    return load_shelters(city_name, lat, lon, entry)
+
+def load_shelters(city_name, lat, lon, entry=None):
+    """Fetch a city's shelters into the store, falling back to the stored entry's on failure"""
+    logger.info("Fetching shelters for %s", city_name)
     try:
-        shelters = shelter_finder.get_shelters_near_location(lat, lon, radius_km=10)
-        
-        # Calculate distances from city center for initial sorting only
-        for shelter in shelters:
-            shelter['distance'] = calculate_distance(lat, lon, shelter['lat'], shelter['lon'])
-        
-        # Sort by distance and take top 5
-        shelters_sorted = sorted(shelters, key=lambda x: x['distance'])[:5]
-        
-        # Remove distance field - will be calculated client-side
-        for shelter in shelters_sorted:
-            del shelter['distance']
-        
-        shelter_cache[cache_key] = shelters_sorted
-        print(f"Found {len(shelters_sorted)} nearest shelters for {city_name}")
-        return shelters_sorted
+        shelters = fetch_shelters(lat, lon)
     except Exception as e:
-        print(f"Error getting shelters for {city_name}: {e}")
-        return []
+        metrics.inc('storm_errors_total', source='overpass')
+        logger.warning("Error getting shelters for %s: %s", city_name, e)
+        shelters = []
+    
+    if not shelters and entry:
+        # Overpass failed or came back empty; keep serving what we had (claim_refresh set the retry backoff)
+        logger.info("Using stale shelters for %s", city_name)
+        return entry[0]
+    
+    # Empty results may be an upstream hiccup, so only keep them briefly
+    shelter_store.put(lat, lon, SHELTER_RADIUS_KM, shelters, ttl=None if shelters else SHELTER_EMPTY_TTL)
+    logger.info("Found %d nearest shelters for %s", len(shelters), city_name)
+    return shelters
+
+def load_nearest_cell(cell):
+    """
+    (shelters, lats, lons, reach_km) around a geohash cell's centre, or None if the lookup failed.
+    Every shelter left out is at least reach_km from the centre.
+    """
+    cell_lat, cell_lon = geohash_decode(cell)
+    height, width = geohash_cell_size(len(cell))
+    half_diagonal = haversine_km(cell_lat, cell_lon, cell_lat + height / 2, cell_lon + width / 2)
+    # Search from the cell centre far enough to cover the radius around every point in the cell
+    radius_km = NEAREST_RADIUS_KM + half_diagonal
+    try:
+        shelters = shelter_finder.nearest_shelters(cell_lat, cell_lon, k=NEAREST_CELL_MAX_CANDIDATES, radius_km=radius_km)
+    except Exception as e:
+        # None is never cached, so the next request for the cell retries upstream
+        metrics.inc('storm_errors_total', source='overpass')
+        logger.warning("Nearest shelter lookup failed for cell %s: %s", cell, e)
+        return None
+    lats = np.array([s['lat'] for s in shelters], dtype=np.float64)
+    lons = np.array([s['lon'] for s in shelters], dtype=np.float64)
+    distances = haversine_many(cell_lat, cell_lon, lats, lons)
+    reach_km = radius_km if len(shelters) < NEAREST_CELL_MAX_CANDIDATES else float(distances.max())
+    if len(shelters) >= NEAREST_MAX_K:
+        # The NEAREST_MAX_K shelters nearest the centre are within D + half_diagonal of any point in the
+        # cell (D: the farthest of them), so nothing beyond D + 2 * half_diagonal can be among its nearest
+        covering_km = float(np.partition(distances, NEAREST_MAX_K - 1)[NEAREST_MAX_K - 1]) + 2 * half_diagonal
+        if covering_km < reach_km:
+            keep = np.flatnonzero(distances <= covering_km)
+            shelters, lats, lons, reach_km = [shelters[i] for i in keep], lats[keep], lons[keep], covering_km
+    return shelters, lats, lons, reach_km
+
+def nearest_in_cell(cell, loaded, lat, lon, k):
+    """
+    The k nearest shelters (within NEAREST_RADIUS_KM) to a point in cell from its cached candidates,
+    or None when a shelter outside them could be among the answer.
+    """
+    shelters, lats, lons, reach_km = loaded
+    nearest = []
+    if shelters:
+        distances = haversine_many(lat, lon, lats, lons)
+        nearest = [i for i in top_k(distances, k) if distances[i] <= NEAREST_RADIUS_KM]
+    # A shelter outside the candidates is at least reach_km - (distance to the centre) from the point,
+    # so the answer is exact only if nothing out there could beat the k-th result (or fill a short list)
+    needed_km = float(distances[nearest[-1]]) if len(nearest) == k else NEAREST_RADIUS_KM
+    if needed_km > reach_km - haversine_km(lat, lon, *geohash_decode(cell)):
+        return None
+    return [dict(shelters[i], distance_km=round(float(distances[i]), 2)) for i in nearest]
+
+def get_nearest_shelters(lat, lon, k=5):
+    """
+    (cell, k nearest shelters with server-computed distances in km) for a coordinate;
+    shelters is None when the lookup failed and nothing is cached for the cell.
+    """
+    cell = geohash_encode(lat, lon, NEAREST_GEOHASH_PRECISION)
+    if shelter_finder.index is not None:
+        # The offline index answers exactly and without network access, so there is nothing to cache
+        with metrics.timed('storm_cache_lookup_seconds', cache='nearest_shelters'):
+            found = shelter_finder.index.nearest(lat, lon, k=k, max_distance_km=NEAREST_RADIUS_KM)
+        return cell, [dict(shelter, distance_km=round(distance, 2)) for distance, shelter in found]
+
+    # Dense areas can fill a coarse cell's candidate list before it covers every point in the cell;
+    # finer cells are cached (and their loads coalesced) the same way
+    for precision in range(NEAREST_GEOHASH_PRECISION, NEAREST_MAX_PRECISION + 1):
+        key = geohash_encode(lat, lon, precision)
+        with metrics.timed('storm_cache_lookup_seconds', cache='nearest_shelters'):
+            # An empty area may be an upstream hiccup, so only keep it briefly
+            loaded = nearest_cache.get(key, lambda key=key: load_nearest_cell(key),
+                                       entry_ttl=lambda value: None if value[0] else SHELTER_EMPTY_TTL)
+        if loaded is None:
+            return cell, None
+        shelters = nearest_in_cell(key, loaded, lat, lon, k)
+        if shelters is not None:
+            return cell, shelters
+        metrics.inc('storm_nearest_cell_refinements_total', precision=str(precision))
+
+    # Over NEAREST_CELL_MAX_CANDIDATES shelters within a few hundred metres; ask for this point alone
+    try:
+        shelters = shelter_finder.nearest_shelters(lat, lon, k=k, radius_km=NEAREST_RADIUS_KM)
+    except Exception as e:
+        metrics.inc('storm_errors_total', source='overpass')
+        logger.warning("Nearest shelter lookup failed for %.4f, %.4f: %s", lat, lon, e)
+        return cell, None
+    return cell, [dict(shelter, distance_km=round(haversine_km(lat, lon, shelter['lat'], shelter['lon']), 2))
+                  for shelter in shelters]
+
+def iter_cities():
+    """Yield (city, coast, lat, lon) for every configured city"""
+    return iter(city_registry)
+
+def build_snapshot(city, coast, lat, lon):
+    """Fetch fresh weather for a city and score it; used by the background poller"""
+    # refresh() returns None when the fetch fails, so the poller counts a failure and keeps the
+    # previous snapshot (and its updated_at) rather than republishing old weather as new
+    weather = weather_cache.refresh(city, lambda: fetch_weather(city, lat, lon))
+    if not weather:
+        return None
+    return weather, get_storm_data(city, coast, weather, get_forecast(city, lat, lon))
+
+def build_risk_grid(stations):
+    """Risk grid over every configured city for [(lat, lon, coast, humidity, wind_speed, pressure), ...]"""
+    version = make_version(RISK_GRID_STEP, RISK_GRID_MAX_DISTANCE_KM, stations)
+    bounds = grid_bounds(((city.lat, city.lon) for city in city_registry), RISK_GRID_MARGIN)
+    with metrics.timed('storm_risk_grid_build_seconds'):
+        return build_grid(stations, bounds, RISK_GRID_STEP, max_distance_km=RISK_GRID_MAX_DISTANCE_KM, version=version)
+
+def risk_stations(weathers):
+    """Risk grid stations for [(city, weather or None), ...]"""
+    return [(city.lat, city.lon, city.coast, weather['humidity'], weather['wind_speed'], weather['pressure'])
+            for city, weather in weathers if weather]
+
+def update_risk_grid(stations):
+    """Rebuild the risk grid if the stations changed since the last build"""
+    global risk_grid
+    version = make_version(RISK_GRID_STEP, RISK_GRID_MAX_DISTANCE_KM, stations)
+    with risk_grid_lock:
+        if risk_grid is None or risk_grid.version != version:
+            risk_grid = build_risk_grid(stations)
+
+def update_risk_grid_from_poller(poller):
+    """WeatherPoller round callback: rebuild the grid from the snapshots just published"""
+    update_risk_grid(risk_stations(
+        (city, snapshot.weather if snapshot else None)
+        for city, snapshot in ((city, poller.get(city.name)) for city in city_registry)
+    ))
+
+weather_poller = None
+if WEATHER_POLL_INTERVAL > 0:
+    weather_poller = WeatherPoller(iter_cities, build_snapshot, interval=WEATHER_POLL_INTERVAL, mode=WEATHER_POLL_MODE,
+                                   max_age=WEATHER_POLL_MAX_AGE, on_round=update_risk_grid_from_poller)
+    weather_poller.start()
+
+def get_shared_snapshot(city):
+    """The city's entry in the shared-memory snapshot store, if one is configured and fresh"""
+    return snapshot_reader.get(city) if snapshot_reader else None
+
+def get_current_weather(city, lat, lon):
+    """Weather for a city from the shared or poller snapshot, falling back to the weather cache"""
+    shared = get_shared_snapshot(city)
+    if shared:
+        return shared['weather']
+    snapshot = weather_poller.get(city) if weather_poller else None
+    if snapshot:
+        return snapshot.weather
+    return get_weather(city, lat, lon)
+
+def get_current_storm(city, coast, lat, lon, with_forecast=True):
+    """
+    (weather, storm) for a city from the shared or poller snapshot, scoring on demand without one.
+    with_forecast=False skips the forecast fetch when the caller does not need the timeline.
+    """
+    shared = get_shared_snapshot(city)
+    if shared:
+        return shared['weather'], shared['storm']
+    snapshot = weather_poller.get(city) if weather_poller else None
+    if snapshot:
+        return snapshot.weather, snapshot.storm
+    weather = get_weather(city, lat, lon)
+    if not weather:
+        return None, None
+    forecast = get_forecast(city, lat, lon) if with_forecast else None
+    return weather, get_storm_data(city, coast, weather, forecast)
+
+def get_current_shelters(city, lat, lon):
+    """Shelters for a city from the shared snapshot, falling back to the shelter store"""
+    shared = get_shared_snapshot(city)
+    if shared:
+        return shared['shelters']
+    return get_shelters(city, lat, lon)
+
+def load_stream_snapshot(city):
+    """(weather, storm) for a streamed city, or None if weather is unavailable"""
+    weather, storm = get_current_storm(*city)
+    return (weather, storm) if weather else None
+
+# Live storm updates: one refresher per streamed city, shared by every open tab. Each open stream holds a
+# worker thread, so streaming is off unless enabled and needs gevent or gthread workers (see README)
+STORM_STREAM = os.getenv("STORM_STREAM", "0") == "1"
+storm_broadcaster = StormBroadcaster(load_stream_snapshot, interval=int(os.getenv("STREAM_REFRESH_INTERVAL", "60")),
+                                     max_subscribers=int(os.getenv("STREAM_MAX_SUBSCRIBERS", "16")))
+
+def prefetch_weather_group(locations):
+    """Warm the weather cache with one group query for cities that have an OpenWeatherMap ID"""
+    grouped = [(city, lat, lon, city_ids[city]) for city, _, lat, lon in locations
+               if city in city_ids and weather_cache.fresh(city) is None]
+    if grouped:
+        for city, weather in fetch_weather_group(grouped).items():
+            weather_cache.put(city, weather)
+
+def get_bulk_conditions(locations):
+    """(weather, storm) for many (city, coast, lat, lon) locations in about one upstream round trip"""
+    locations = list(locations)
+    prefetch_weather_group(locations)
+    # Everything else fans out concurrently; cache coalescing dedupes overlapping requests
+    return list(bulk_executor.map(lambda location: get_current_storm(*location, with_forecast=False), locations))
+
+def current_risk_stations():
+    """Latest observation of every city as risk grid stations"""
+    locations = list(city_registry)
+    prefetch_weather_group(locations)
+    weathers = bulk_executor.map(lambda location: get_current_weather(location.name, location.lat, location.lon), locations)
+    return risk_stations(zip(locations, weathers))
+
+def run_risk_grid_builder():
+    """Without a poller, rebuild the grid from the cached observations as often as they can change"""
+    while True:
+        try:
+            update_risk_grid(current_risk_stations())
+        except Exception as e:
+            metrics.inc('storm_errors_total', source='risk_grid')
+            logger.warning("Error rebuilding risk grid: %s", e)
+        time.sleep(WEATHER_CACHE_TTL)
+
+def get_risk_grid():
+    """
+    The current risk grid, or None before the first one is built. Requests never build it:
+    it comes from the snapshot refresher, the weather poller's rounds or, without either,
+    a background builder started on first use.
+    """
+    global risk_grid, risk_grid_builder
+    shared = snapshot_reader.payload() if snapshot_reader else None
+    if shared and shared.get('risk_grid'):
+        version, data = shared['risk_grid']
+        if risk_grid is None or risk_grid.version != version:
+            risk_grid = RiskGrid.from_bytes(data, version)
+        return risk_grid
+
+    if weather_poller is None and risk_grid_builder is None:
+        with risk_grid_lock:
+            if risk_grid_builder is None:
+                risk_grid_builder = threading.Thread(target=run_risk_grid_builder, name='risk-grid', daemon=True)
+                risk_grid_builder.start()
+    return risk_grid
+
+def risk_grid_unavailable():
+    return jsonify({'error': 'The risk map is still being built'}), 503, {'Retry-After': '5'}
+
+def render_page(template, **context):
+    """render_template, timed per template"""
+    with metrics.timed('storm_render_seconds', template=template):
+        return render_template(template, **context)
+
+def observation_version(weather):
+    """Identifies one weather observation; falls back to hashing the data if the timestamp is missing"""
+    return weather.get('observed_at') or weather_version(weather)
+
+def shelters_version(shelters):
+    return tuple((shelter['name'], shelter['lat'], shelter['lon']) for shelter in shelters)
+
+def cached_json(key, version, data):
+    """JSON response served from the response cache, rendered only when version changes"""
+    entry = response_cache.get(key, make_version(*key, version), lambda: app.json.dumps(data) + '\n', 'application/json')
+    return response_cache.respond(entry, request)
+
+def weather_page_response(city, weather):
+    version = make_version(TEMPLATE_VERSION, city, observation_version(weather))
+    entry = response_cache.get(('weather', city), version, lambda: render_page(
+        'weather.html', weather=weather, cities=city_registry.dropdown, selected_city=city))
+    return response_cache.respond(entry, request)
+
+def storm_page_response(city, weather, storm, shelters):
+    version = make_version(TEMPLATE_VERSION, city, observation_version(weather),
+                           shelters_version(shelters), repr(storm['timeline']))
+    entry = response_cache.get(('storm', city), version, lambda: render_page(
+        'storm.html', weather=weather, storm=storm, shelters=shelters, cities=city_registry.dropdown,
+        stream=STORM_STREAM))
+    return response_cache.respond(entry, request)
 
 @app.route('/')
 def index():
-    city_list = []
-    for coast, cities_list in cities.items():
-        for city, lat, lon in cities_list:
-            city_list.append({'name': city, 'coast': coast})
-    return render_template('index.html', cities=city_list)
+    return render_page('index.html', cities=city_registry.dropdown)
+
+@app.route('/risk-map')
+def risk_map_page():
+    """Region-wide storm risk map drawn from pre-rendered tiles"""
+    bounds = grid_bounds(((city.lat, city.lon) for city in city_registry), RISK_GRID_MARGIN)
+    entry = response_cache.get(('risk-map',), make_version(TEMPLATE_VERSION, bounds), lambda: render_page(
+        'risk_map.html', cities=city_registry.dropdown, bounds=bounds, max_zoom=RISK_TILE_MAX_ZOOM,
+        legend=list(zip(CATEGORY_LEVELS[:-1], PALETTE[:-1]))))
+    return response_cache.respond(entry, request)
+
+@app.route('/tiles/risk/<int:z>/<int:x>/<int:y>.png')
+def risk_tile(z, x, y):
+    """256px Web Mercator risk tile, rendered once per grid version"""
+    if not tile_in_range(z, x, y, RISK_TILE_MAX_ZOOM):
+        abort(404)
+    grid = get_risk_grid()
+    if grid is None:
+        return risk_grid_unavailable()
+    entry = tile_cache.get(('risk', z, x, y), grid.version, lambda: grid.render_tile(z, x, y), 'image/png')
+    return tile_cache.respond(entry, request)
+
+@app.route('/api/risk/grid')
+def get_risk_grid_api():
+    """The whole risk grid in its compact binary form (see risk_grid.py for the layout)"""
+    grid = get_risk_grid()
+    if grid is None:
+        return risk_grid_unavailable()
+    entry = response_cache.get(('risk-grid',), grid.version, grid.to_bytes, 'application/octet-stream')
+    return response_cache.respond(entry, request)
+
+@app.route('/api/risk/point')
+def get_risk_point_api():
+    """Interpolated risk at ?lat=&lon="""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({'error': 'lat and lon are required'}), 400
+    grid = get_risk_grid()
+    if grid is None:
+        return risk_grid_unavailable()
+    risk = grid.at(lat, lon)
+    if risk is None:
+        return jsonify({'error': 'No observations near this point'}), 404
+    return jsonify(dict(risk, lat=lat, lon=lon))
 
 @app.route('/weather/<city>')
 def weather_page(city):
-    city_data = None
-    coast_name = None
-    for coast, cities_list in cities.items():
-        for c_name, lat, lon in cities_list:
-            if c_name.lower() == city.lower():
-                city_data = {'name': c_name, 'lat': lat, 'lon': lon}
-                coast_name = coast
-                break
-        if city_data:
-            break
-
+    city_data = city_registry.get(city)
     if not city_data:
         return redirect(url_for('index'))
 
-    weather = fetch_weather(city_data['name'], city_data['lat'], city_data['lon'])
+    weather = get_current_weather(city_data.name, city_data.lat, city_data.lon)
     if not weather:
         return redirect(url_for('index'))
 
-    city_list = []
-    for coast, cities_list in cities.items():
-        for c_name, _, _ in cities_list:
-            city_list.append({'name': c_name, 'coast': coast})
-
-    return render_template('weather.html', weather=weather, cities=city_list, selected_city=city)
+    return weather_page_response(city_data.name, weather)
 
 @app.route('/storm/<city>')
 def storm_page(city):
-    city_data = None
-    coast_name = None
-    for coast, cities_list in cities.items():
-        for c_name, lat, lon in cities_list:
-            if c_name.lower() == city.lower():
-                city_data = {'name': c_name, 'lat': lat, 'lon': lon}
-                coast_name = coast
-                break
-        if city_data:
-            break
-
+    city_data = city_registry.get(city)
     if not city_data:
         return redirect(url_for('index'))
 
-    weather = fetch_weather(city_data['name'], city_data['lat'], city_data['lon'])
+    # Get top 4-5 nearest shelters while the weather loads, so a cold page waits for the slower of the two
+    shelters = bulk_executor.submit(get_current_shelters, city_data.name, city_data.lat, city_data.lon)
+    weather, storm = get_current_storm(city_data.name, city_data.coast, city_data.lat, city_data.lon)
     if not weather:
         return redirect(url_for('index'))
+    shelters = shelters.result()
 
-    storm = get_storm_data(city_data['name'], coast_name, weather)
-    
-    # Get top 4-5 nearest shelters
-    shelters = get_shelters(city_data['name'], city_data['lat'], city_data['lon'])
-
-    city_list = []
-    for coast, cities_list in cities.items():
-        for c_name, _, _ in cities_list:
-            city_list.append({'name': c_name, 'coast': coast})
-
-    return render_template('storm.html', weather=weather, storm=storm, shelters=shelters, cities=city_list)
+    return storm_page_response(city_data.name, weather, storm, shelters)
 
 @app.route('/api/weather/<city>')
 def get_weather_api(city):
-    for coast, cities_list in cities.items():
-        for city_name, lat, lon in cities_list:
-            if city_name.lower() == city.lower():
-                weather = fetch_weather(city_name, lat, lon)
-                if weather:
-                    weather['coast'] = coast
-                    return jsonify(weather)
+    city_data = city_registry.get(city)
+    if city_data:
+        weather = get_current_weather(city_data.name, city_data.lat, city_data.lon)
+        if weather:
+            return cached_json(('weather-api', city_data.name), observation_version(weather), dict(weather, coast=city_data.coast))
     return jsonify({'error': 'City not found'}), 404
 
+@app.route('/api/weather')
+def get_bulk_weather_api():
+    """Weather and storm risk for every city, or every city on ?coast="""
+    coast = request.args.get('coast')
+    if coast and coast not in city_registry.by_coast:
+        return jsonify({'error': 'Coast not found'}), 404
+
+    locations = city_registry.by_coast[coast] if coast else list(city_registry)
+    results = []
+    for (city_name, city_coast, _, _), (weather, storm) in zip(locations, get_bulk_conditions(locations)):
+        if not weather:
+            results.append({'city': city_name, 'coast': city_coast, 'error': 'Weather unavailable'})
+            continue
+        results.append(dict(weather, coast=city_coast, storm={
+            'risk_level': storm['risk_level'],
+            'alert_color': storm['alert_color'],
+            'probability': storm['probability'],
+            'storm_type': storm['storm_type'],
+            'rainfall_type': storm['rainfall_type']
+        }))
+    return jsonify({'coast': coast, 'count': len(results), 'cities': results})
+
+@app.route('/api/shelters/nearest')
+def get_nearest_shelters_api():
+    """Nearest shelters to an arbitrary coordinate: ?lat=..&lon=..&k=.."""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    k = request.args.get('k', default=5, type=int)
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return jsonify({'error': 'Valid lat and lon are required'}), 400
+    if not 1 <= k <= NEAREST_MAX_K:
+        return jsonify({'error': f'k must be between 1 and {NEAREST_MAX_K}'}), 400
+
+    cell, shelters = get_nearest_shelters(lat, lon, k)
+    if shelters is None:
+        return jsonify({'error': 'Shelter lookup is temporarily unavailable'}), 503
+    return jsonify({'lat': lat, 'lon': lon, 'k': k, 'cell': cell, 'shelters': shelters, 'count': len(shelters)})
+
+def parse_allocation_request(body):
+    """(cells array [[lat, lon, population], ...], shelters, options) from a request body; raises ValueError"""
+    try:
+        cells = np.asarray(body.get('cells') or [], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('cells must be a list of [lat, lon, population]')
+    if cells.ndim != 2 or cells.shape[1] != 3 or not len(cells):
+        raise ValueError('cells must be a non-empty list of [lat, lon, population]')
+    if len(cells) > ALLOCATION_MAX_CELLS:
+        raise ValueError(f'At most {ALLOCATION_MAX_CELLS} cells are allowed')
+    if not np.isfinite(cells).all() or (np.abs(cells[:, 0]) > 90).any() or (np.abs(cells[:, 1]) > 180).any() \
+            or (cells[:, 2] < 0).any():
+        raise ValueError('cells need valid coordinates and non-negative populations')
+
+    bound = body.get('capacity', 'min')
+    if bound not in CAPACITY_BOUNDS and bound != 'mid':
+        raise ValueError('capacity must be min, mid or max')
+    k = body.get('k', 8)
+    if not isinstance(k, int) or not 1 <= k <= NEAREST_MAX_K:
+        raise ValueError(f'k must be between 1 and {NEAREST_MAX_K}')
+    max_distance_km = body.get('max_distance_km')
+    if max_distance_km is not None and (not isinstance(max_distance_km, (int, float)) or max_distance_km <= 0):
+        raise ValueError('max_distance_km must be a positive number')
+
+    shelters = body.get('shelters')
+    if shelters is not None:
+        if not isinstance(shelters, list) or len(shelters) > ALLOCATION_MAX_SHELTERS or \
+                not all(isinstance(shelter, dict) and 'lat' in shelter and 'lon' in shelter for shelter in shelters):
+            raise ValueError(f'shelters must be a list of at most {ALLOCATION_MAX_SHELTERS} objects with lat and lon')
+    elif shelter_finder.index is None and search_area(cells)[2] > ALLOCATION_MAX_SEARCH_RADIUS_KM:
+        raise ValueError(f'cells span more than {ALLOCATION_MAX_SEARCH_RADIUS_KM} km from their centre; pass shelters '
+                         'or split the request')
+    return cells, shelters, {'capacity': bound, 'k': k, 'max_distance_km': max_distance_km}
+
+def search_area(cells):
+    """(lat, lon, radius_km) of a circle covering every population cell plus a margin"""
+    lat, lon = float(cells[:, 0].mean()), float(cells[:, 1].mean())
+    radius_km = float(haversine_many(lat, lon, cells[:, 0], cells[:, 1]).max()) + ALLOCATION_SEARCH_MARGIN_KM
+    return lat, lon, radius_km
+
+def shelters_around(cells):
+    """Known shelters covering every population cell, from the offline index or Overpass; raises on upstream errors"""
+    lat, lon, radius_km = search_area(cells)
+    return shelter_finder.get_shelters_near_location(lat, lon, radius_km=radius_km, limit=ALLOCATION_MAX_SHELTERS,
+                                                     raise_errors=True)
+
+def shelter_capacity(shelter, bound):
+    """People a shelter takes at the requested bound; raises TypeError/ValueError on unusable capacities"""
+    low, high = (float(value) for value in capacity_range(shelter))
+    if not 0 <= low <= high < float('inf'):
+        raise ValueError(f'capacity range {low}-{high} is not valid')
+    return (low + high) / 2 if bound == 'mid' else (low, high)[CAPACITY_BOUNDS[bound]]
+
+@app.route('/api/evacuation/allocate', methods=['POST'])
+def allocate_evacuation_api():
+    """
+    Assign population cells to shelters within capacity, nearest first.
+    Body: {"cells": [[lat, lon, population], ...], "shelters": [...] (optional, defaults to known
+    shelters around the cells), "capacity": "min"|"mid"|"max", "k": 8, "max_distance_km": null}
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'A JSON object body is required'}), 400
+    try:
+        cells, shelters, options = parse_allocation_request(body)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if shelters is None:
+        try:
+            shelters = shelters_around(cells)
+        except Exception as e:
+            metrics.inc('storm_errors_total', source='overpass')
+            logger.warning("Shelter lookup for allocation failed: %s", e)
+            return jsonify({'error': 'Shelter lookup is temporarily unavailable'}), 503
+    if not shelters:
+        return jsonify({'error': 'No shelters found around these cells'}), 404
+    try:
+        capacity = [shelter_capacity(shelter, options['capacity']) for shelter in shelters]
+        shelter_lats = [float(shelter['lat']) for shelter in shelters]
+        shelter_lons = [float(shelter['lon']) for shelter in shelters]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'shelters need numeric lat and lon, and 0 <= capacity_min <= capacity_max'}), 400
+
+    started = time.perf_counter()
+    with metrics.timed('storm_allocation_seconds'):
+        result = allocate(cells[:, 0], cells[:, 1], cells[:, 2], shelter_lats, shelter_lons, capacity,
+                          k=options['k'], max_distance_km=options['max_distance_km'])
+
+    waiting = np.flatnonzero(result.unassigned)
+    return jsonify({
+        'summary': dict(result.summary(), cells=len(cells), shelters=len(shelters), capacity=options['capacity'],
+                        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)),
+        'shelters': [
+            {'name': shelter.get('name'), 'lat': lat, 'lon': lon, 'capacity': int(round(room)), 'assigned': int(load)}
+            for shelter, lat, lon, room, load in zip(shelters, shelter_lats, shelter_lons, capacity, result.load)
+        ],
+        'assignments': [
+            [cell, shelter, people, round(distance, 3)]
+            for cell, shelter, people, distance in zip(result.cell.tolist(), result.shelter.tolist(),
+                                                       result.people.tolist(), result.distance_km.tolist())
+        ],
+        'unassigned': [[cell, people] for cell, people in zip(waiting.tolist(), result.unassigned[waiting].tolist())],
+    })
+
 @app.route('/api/shelters/<city>')
 def get_shelters_api(city):
     """API endpoint to get shelters for a city"""
-    for coast, cities_list in cities.items():
-        for city_name, lat, lon in cities_list:
-            if city_name.lower() == city.lower():
-                shelters = get_shelters(city_name, lat, lon)
-                return jsonify({'shelters': shelters, 'count': len(shelters)})
-    return jsonify({'error': 'City not found'}), 404
+    city_data = city_registry.get(city)
+    if not city_data:
+        return jsonify({'error': 'City not found'}), 404
+    shelters = get_current_shelters(city_data.name, city_data.lat, city_data.lon)
+    return cached_json(('shelters-api', city_data.name), shelters_version(shelters), {'shelters': shelters, 'count': len(shelters)})
+
+@app.route('/api/history/<city>')
+def get_history_api(city):
+    """Recorded observations for a city: ?hours=24, optionally averaged into ?bucket= second buckets"""
+    city_data = city_registry.get(city)
+    if not city_data:
+        return jsonify({'error': 'City not found'}), 404
+    if observation_store is None:
+        return jsonify({'error': 'Observation history is disabled'}), 404
+
+    hours = request.args.get('hours', default=24, type=float)
+    bucket = request.args.get('bucket', type=int)
+    agg = request.args.get('agg', default='mean')
+    if not 0 < hours <= HISTORY_MAX_HOURS:
+        return jsonify({'error': f'hours must be between 0 and {HISTORY_MAX_HOURS}'}), 400
+
+    end = int(datetime.now().timestamp())
+    start = end - int(hours * 3600)
+    if bucket:
+        if bucket < 60:
+            return jsonify({'error': 'bucket must be at least 60 seconds'}), 400
+        try:
+            series = observation_store.downsample(city_data.name, start, end, bucket, agg)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        series = observation_store.scan(city_data.name, start, end)
+
+    columns = {name: [None if value != value else round(value, 2) for value in values.tolist()]
+               for name, values in series.items() if name not in ('ts', 'count')}
+    return jsonify({
+        'city': city_data.name,
+        'hours': hours,
+        'bucket': bucket,
+        'count': len(series['ts']),
+        'ts': series['ts'].tolist(),
+        'series': columns,
+        'pressure_trend_3h': observation_store.pressure_trend(city_data.name)
+    })
+
+@app.route('/stream/storm/<city>')
+def stream_storm(city):
+    """Server-sent events carrying a new storm snapshot whenever the city's weather changes"""
+    if not STORM_STREAM:
+        return jsonify({'error': 'Live storm updates are disabled'}), 404
+    city_data = city_registry.get(city)
+    if not city_data:
+        return jsonify({'error': 'City not found'}), 404
+
+    subscription = storm_broadcaster.subscribe(city_data)
+    if subscription is None:
+        # Browsers do not reconnect after a non-200 response, so the page just stays as rendered
+        return jsonify({'error': 'Too many live update streams, reload the page for new data'}), 503, {'Retry-After': '60'}
+
+    def events():
+        try:
+            yield 'retry: 10000\n\n'
+            yield from subscription
+        finally:
+            subscription.close()
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Hit/miss counters and entry ages for the weather and shelter caches"""
+    stats = {'weather': weather_cache.stats(), 'forecasts': forecast_cache.stats(), 'responses': response_cache.stats(), 'risk_tiles': tile_cache.stats(), 'shelters': shelter_store.stats(), 'streams': storm_broadcaster.stats()}
+    nearest = nearest_cache.stats()
+    nearest.pop('ages')
+    stats['nearest_shelters'] = nearest
+    if snapshot_reader:
+        stats['shared_snapshots'] = snapshot_reader.stats()
+    if weather_poller:
+        stats['poller'] = {
+            'mode': weather_poller.mode,
+            'interval': weather_poller.interval,
+            'rounds': weather_poller.rounds,
+            'failures': weather_poller.failures,
+            'last_round_seconds': round(weather_poller.last_round_seconds, 3),
+            'cities': len(weather_poller.snapshots()),
+            'stale': weather_poller.stale(),
+            'max_age': weather_poller.max_age
+        }
+    return jsonify(stats)
+
+@app.route('/api/upstream/stats')
+def get_upstream_stats():
+    """Request counters, circuit breaker state and latency histograms per upstream"""
+    return jsonify(http_client.stats())
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Per-route latency histogram and status counters; routes are labelled by their URL rule"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('storm_http_request_seconds', time.perf_counter() - started, route=route)
+        metrics.inc('storm_http_requests_total', route=route, status=response.status_code)
+        if response.status_code >= 500:
+            metrics.inc('storm_errors_total', source='http')
+    return response
+
+def collect_metrics():
+    """Export the counters caches, upstream clients and background workers already keep"""
+    for name, cache in (('weather', weather_cache), ('forecast', forecast_cache), ('nearest_shelters', nearest_cache)):
+        stats = cache.stats()
+        for key in ('hits', 'stale_hits', 'misses', 'upstream_loads', 'load_errors'):
+            yield 'counter', f'storm_cache_{key}_total', {'cache': name}, stats[key]
+        yield 'gauge', 'storm_cache_hit_ratio', {'cache': name}, stats['hit_ratio']
+        yield 'gauge', 'storm_cache_entries', {'cache': name}, stats['entries']
+
+    responses = response_cache.stats()
+    for key in ('hits', 'renders', 'not_modified'):
+        yield 'counter', f'storm_response_cache_{key}_total', {}, responses[key]
+    yield 'gauge', 'storm_response_cache_hit_ratio', {}, responses['hit_ratio'] or 0.0
+
+    for name, client in http_client.upstreams.items():
+        labels = {'upstream': name}
+        yield 'histogram', 'storm_upstream_request_seconds', labels, client.latency
+        for key in ('requests', 'errors', 'retried', 'rejected'):
+            yield 'counter', f'storm_upstream_{key}_total', labels, getattr(client, key)
+        yield 'gauge', 'storm_upstream_circuit_open', labels, 0 if client.breaker.state == 'closed' else 1
+
+    streams = storm_broadcaster.stats()
+    yield 'counter', 'storm_stream_published_total', {}, streams['published']
+    yield 'counter', 'storm_stream_rejected_total', {}, streams['rejected']
+    yield 'gauge', 'storm_stream_subscribers', {}, sum(streams['subscribers'].values())
+    if weather_poller:
+        yield 'counter', 'storm_poller_rounds_total', {}, weather_poller.rounds
+        yield 'counter', 'storm_poller_failures_total', {}, weather_poller.failures
+        yield 'gauge', 'storm_poller_last_round_seconds', {}, weather_poller.last_round_seconds
+        yield 'gauge', 'storm_poller_stale_cities', {}, weather_poller.stale()
+    if snapshot_reader:
+        shared = snapshot_reader.stats()
+        yield 'gauge', 'storm_shared_snapshot_version', {}, shared['version'] or 0
+        yield 'gauge', 'storm_shared_snapshot_age_seconds', {}, shared['age'] if shared['age'] is not None else -1
+    yield 'gauge', 'storm_profiler_running', {}, int(metrics.profiler.running)
+
+metrics.registry.add_collector(collect_metrics)
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition of request, upstream, cache, scoring and render metrics"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def profiler_control():
+    """POST ?action=start|stop switches the sampling profiler; GET returns folded stacks"""
+    if not PROFILER_ENABLED:
+        abort(404)
+    profiler = metrics.profiler
+    if request.method == 'POST':
+        action = request.args.get('action')
+        if action == 'start':
+            profiler.start()
+        elif action == 'stop':
+            profiler.stop()
+        else:
+            return jsonify({'error': 'action must be start or stop'}), 400
+        return jsonify({'running': profiler.running, 'samples': profiler.samples})
+    return Response(profiler.report(request.args.get('limit', type=int)), mimetype='text/plain')
+
+@app.cli.command('seed-shelters')
+@click.option('--force', is_flag=True, help='Re-fetch cities that already have unexpired shelters.')
+def seed_shelters(force):
+    """Pre-seed the shelter store for every configured city"""
+    for city, coast, lat, lon in iter_cities():
+        # Expired entries are fetched here rather than in the background, which would outlive the command
+        shelters = get_shelters(city, lat, lon, refresh=force or shelter_store.get(lat, lon, SHELTER_RADIUS_KM) is None)
+        click.echo(f"{city}: {len(shelters)} shelters")
+    purged = shelter_store.purge_expired(older_than=30 * 24 * 3600)
+    click.echo(f"Purged {purged} long-expired entries")
+
+@app.cli.command('refresh-shelters')
+@click.option('--tiles-per-query', default=8, show_default=True, help='Merged city tiles sent in one Overpass query.')
+@click.option('--output', default=CITY_SHELTER_INDEX_PATH, show_default=True,
+              help='Where to write the index of city shelters (kept apart from a full-region SHELTER_INDEX_PATH).')
+def refresh_shelters(tiles_per_query, output):
+    """Download shelters for every city in a few bulk Overpass queries and rebuild the city index and store"""
+    if os.path.abspath(output) == os.path.abspath(SHELTER_INDEX_PATH) and shelter_index is not None:
+        raise click.ClickException(f"{output} is the loaded SHELTER_INDEX_PATH; refusing to replace it with city shelters only")
+    queries = plan_queries(((city.lat, city.lon) for city in city_registry), SHELTER_RADIUS_KM, tiles_per_query)
+    click.echo(f"{len(city_registry)} cities -> {sum(len(q) for q in queries)} tiles in {len(queries)} queries")
+    try:
+        index = download_index(queries, client=http_client.overpass)
+    except Exception as e:
+        raise click.ClickException(f"Bulk shelter download failed: {e}")
+    index.save(output)
+    click.echo(f"Indexed {len(index)} shelters into {output}")
+
+    # Derive every city's shelters from the fresh index (no further Overpass calls)
+    shelter_finder.index = index
+    for city, coast, lat, lon in iter_cities():
+        shelters = get_shelters(city, lat, lon, refresh=True)
+        click.echo(f"{city}: {len(shelters)} shelters")
+
+@app.cli.command('snapshot-refresher')
+@click.option('--interval', default=WEATHER_POLL_INTERVAL or 300, show_default=True, help='Seconds between refresh rounds.')
+@click.option('--slot-size', default=2 * 1024 * 1024, show_default=True, help='Bytes reserved for each payload copy.')
+def snapshot_refresher(interval, slot_size):
+    """Refresh every city on an interval and publish snapshots to SNAPSHOT_SHM_NAME for all workers"""
+    if not SNAPSHOT_SHM_NAME:
+        raise click.ClickException("Set SNAPSHOT_SHM_NAME to the shared memory segment name")
+    store = SharedSnapshotStore.create(SNAPSHOT_SHM_NAME, slot_size=slot_size)
+    poller = WeatherPoller(iter_cities, build_snapshot, interval=interval, mode=WEATHER_POLL_MODE)
+    click.echo(f"Publishing snapshots to shared memory '{SNAPSHOT_SHM_NAME}' every {interval}s")
+    try:
+        while True:
+            started = time.monotonic()
+            poller.poll_once()
+            cities = {}
+            for city in city_registry:
+                # get() skips cities whose last successful poll is older than the poller's max_age
+                snapshot = poller.get(city.name)
+                if snapshot is None:
+                    continue
+                cities[city.name] = {
+                    'weather': dict(snapshot.weather),
+                    'storm': dict(snapshot.storm),
+                    'shelters': get_shelters(city.name, city.lat, city.lon),
+                    'updated_at': snapshot.updated_at,
+                }
+            stations = risk_stations((city, cities[city.name]['weather'] if city.name in cities else None)
+                                     for city in city_registry)
+            grid = build_risk_grid(stations)
+            try:
+                version = store.write({'written_at': time.time(), 'cities': cities, 'risk_grid': (grid.version, grid.to_bytes())})
+            except ValueError as e:
+                # Workers keep the previous payload until it ages out; raise --slot-size to fix
+                metrics.inc('storm_errors_total', source='snapshot_store')
+                logger.error("Skipped snapshot publish: %s", e)
+            else:
+                logger.info("Published snapshot version %d for %d cities", version, len(cities))
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import contextlib
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Stored columns and their on-disk dtypes; 'ts' is the observation time in unix seconds
+COLUMNS = {
+    'ts': np.int64,
+    'temp': np.float32,
+    'humidity': np.float32,
+    'pressure': np.float32,
+    'wind_speed': np.float32,
+    'wind_deg': np.float32,
+    'visibility': np.float32,
+}
+
+AGGREGATES = ('mean', 'min', 'max')
+
+
+def _slug(city: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', city.lower()).strip('-')
+
+
+def _month_start(ts: int) -> datetime:
+    moment = datetime.fromtimestamp(ts, timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Exclusive inter-process lock held on path for the duration of the block"""
+    with open(path, 'a+') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            # LK_LOCK retries for about 10 seconds before failing
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _months(start: int, end: int) -> Iterable[str]:
+    """Chunk names (YYYY-MM) covering [start, end]"""
+    month = _month_start(start)
+    last = _month_start(end)
+    while month <= last:
+        yield month.strftime('%Y-%m')
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+class ObservationStore:
+    """
+    Append-only columnar store of weather observations.
+
+    Each city has one chunk directory per month holding a flat binary file per
+    column (int64 timestamps, float32 measurements), so a time-range scan only
+    reads the months it touches and only the columns it needs. Appends take an
+    exclusive lock on the chunk, keep timestamps increasing and drop repeats of
+    the same observation, so several worker processes can record safely.
+    """
+
+    def __init__(self, root: str = 'observations'):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _chunk_dir(self, city: str, month: str) -> str:
+        return os.path.join(self.root, _slug(city), month)
+
+    def append(self, city: str, observation: Dict, ts: Optional[int] = None) -> bool:
+        """Record one observation; returns False if it is not newer than the last stored one"""
+        ts = int(ts if ts is not None else observation.get('observed_at') or time.time())
+        chunk = self._chunk_dir(city, _month_start(ts).strftime('%Y-%m'))
+        with self._lock:
+            os.makedirs(chunk, exist_ok=True)
+            with _file_lock(os.path.join(chunk, '.lock')):
+                rows = self._repair_chunk(chunk)
+                if rows:
+                    with open(os.path.join(chunk, 'ts.bin'), 'rb') as f:
+                        f.seek((rows - 1) * 8)
+                        if int(np.frombuffer(f.read(8), dtype=np.int64)[0]) >= ts:
+                            return False
+                for column, dtype in COLUMNS.items():
+                    value = ts if column == 'ts' else observation.get(column, np.nan)
+                    with open(os.path.join(chunk, f'{column}.bin'), 'ab') as f:
+                        f.write(np.array([value], dtype=dtype).tobytes())
+        return True
+
+    @staticmethod
+    def _repair_chunk(chunk: str) -> int:
+        """
+        Truncate every column file of a chunk to the rows all of them hold and return that count.
+        An append that died part way (a killed worker, a full disk) leaves some files a row ahead;
+        cutting them back keeps every later row aligned across columns. Call with the chunk locked.
+        """
+        sizes = {}
+        for column, dtype in COLUMNS.items():
+            path = os.path.join(chunk, f'{column}.bin')
+            sizes[path] = (os.path.getsize(path) if os.path.exists(path) else 0, np.dtype(dtype).itemsize)
+        rows = min(size // itemsize for size, itemsize in sizes.values())
+        for path, (size, itemsize) in sizes.items():
+            if size > rows * itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * itemsize)
+        return rows
+
+    def cities(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.listdir(self.root))
+
+    def _read_chunk(self, chunk: str, columns: Iterable[str], start: int, end: int) -> Optional[Dict[str, np.ndarray]]:
+        ts_path = os.path.join(chunk, 'ts.bin')
+        if not os.path.exists(ts_path):
+            return None
+        ts = np.fromfile(ts_path, dtype=np.int64)
+        # Columns are written after ts, so a concurrent or interrupted append may leave ts one row ahead
+        rows = min([len(ts)] + [os.path.getsize(os.path.join(chunk, f'{c}.bin')) // np.dtype(COLUMNS[c]).itemsize
+                                for c in columns if c != 'ts'])
+        lo = int(np.searchsorted(ts[:rows], start, side='left'))
+        hi = int(np.searchsorted(ts[:rows], end, side='right'))
+        if lo >= hi:
+            return None
+        result = {'ts': ts[lo:hi]}
+        for column in columns:
+            if column == 'ts':
+                continue
+            dtype = np.dtype(COLUMNS[column])
+            result[column] = np.fromfile(os.path.join(chunk, f'{column}.bin'), dtype=dtype,
+                                         count=hi - lo, offset=lo * dtype.itemsize)
+        return result
+
+    def _chunks(self, city: str, start: int, end: int, columns: Iterable[str]):
+        for month in _months(start, end):
+            data = self._read_chunk(self._chunk_dir(city, month), columns, start, end)
+            if data is not None:
+                yield data
+
+    def scan(self, city: str, start: int, end: int, columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """All observations with start <= ts <= end, as one array per column"""
+        columns = list(columns or COLUMNS)
+        parts = list(self._chunks(city, start, end, columns))
+        return {
+            column: np.concatenate([part[column] for part in parts]) if parts else np.empty(0, dtype=COLUMNS[column])
+            for column in ['ts'] + [c for c in columns if c != 'ts']
+        }
+
+    def last_hours(self, city: str, hours: float, columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        now = int(time.time())
+        return self.scan(city, now - int(hours * 3600), now, columns)
+
+    def downsample(self, city: str, start: int, end: int, bucket_seconds: int, agg: str = 'mean',
+                   columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Aggregate observations into fixed buckets, reading one monthly chunk at a time.
+        Returns bucket start times, per-bucket counts and one array per column;
+        buckets with no observations are left out.
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {AGGREGATES}")
+        columns = [c for c in (columns or COLUMNS) if c != 'ts']
+        n_buckets = (end - start) // bucket_seconds + 1
+        counts = np.zeros(n_buckets, dtype=np.int64)
+        if agg == 'mean':
+            acc = {c: np.zeros(n_buckets) for c in columns}
+        else:
+            acc = {c: np.full(n_buckets, np.inf if agg == 'min' else -np.inf) for c in columns}
+
+        for part in self._chunks(city, start, end, columns):
+            buckets = (part['ts'] - start) // bucket_seconds
+            counts += np.bincount(buckets, minlength=n_buckets)
+            for column in columns:
+                values = part[column].astype(np.float64)
+                if agg == 'mean':
+                    acc[column] += np.bincount(buckets, weights=values, minlength=n_buckets)
+                elif agg == 'min':
+                    np.minimum.at(acc[column], buckets, values)
+                else:
+                    np.maximum.at(acc[column], buckets, values)
+
+        filled = counts > 0
+        result = {'ts': start + np.flatnonzero(filled) * bucket_seconds, 'count': counts[filled]}
+        for column in columns:
+            values = acc[column][filled]
+            result[column] = values / counts[filled] if agg == 'mean' else values
+        return result
+
+    def pressure_trend(self, city: str, hours: float = 3) -> Optional[float]:
+        """Change in pressure (hPa) over the last few hours, or None without enough history"""
+        data = self.last_hours(city, hours, ['pressure'])
+        if len(data['ts']) < 2:
+            return None
+        return float(data['pressure'][-1] - data['pressure'][0])
@@ -0,0 +1,128 @@
+import codecs
+import json
+import math
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+
+# OSM amenity values treated as potential emergency shelters (plus building=civic)
+SHELTER_AMENITIES = ('hospital', 'school', 'community_centre', 'social_facility', 'place_of_worship', 'townhall')
+
+# (south, west, north, east) in degrees
+BBox = Tuple[float, float, float, float]
+
+# Largest side of a merged tile, so a chain of overlapping boxes never becomes a region-sized query
+MAX_TILE_DEGREES = 1.0
+
+_ELEMENTS_START = re.compile(r'"elements"\s*:\s*\[')
+
+
+def bbox_around(lat: float, lon: float, radius_km: float) -> BBox:
+    lat_delta = radius_km / 111.0
+    lon_delta = radius_km / (111.0 * math.cos(math.radians(lat)))
+    return lat - lat_delta, lon - lon_delta, lat + lat_delta, lon + lon_delta
+
+
+def shelter_query(bboxes: Sequence[BBox], timeout: int = 25) -> str:
+    """
+    Overpass QL for shelter features in one or more boxes: one nwr clause with a
+    tag regex per box instead of a node and a way clause per tag.
+    """
+    amenities = '|'.join(SHELTER_AMENITIES)
+    clauses = []
+    for bbox in bboxes:
+        box = ','.join(f"{value:.5f}" for value in bbox)
+        clauses.append(f'  nwr["amenity"~"^({amenities})$"]({box});')
+        clauses.append(f'  nwr["building"="civic"]({box});')
+    body = '\n'.join(clauses)
+    return f"[out:json][timeout:{timeout}];\n(\n{body}\n);\nout center;"
+
+
+def _overlaps(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _union(a: BBox, b: BBox) -> BBox:
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def merge_bboxes(bboxes: Iterable[BBox], max_degrees: float = MAX_TILE_DEGREES) -> List[BBox]:
+    """
+    Union overlapping boxes until no two tiles can merge. Tiles whose union would
+    be more than max_degrees on a side are left apart, even if they overlap.
+    """
+    tiles = sorted(bboxes)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for box in tiles:
+            for i, tile in enumerate(result):
+                if not _overlaps(box, tile):
+                    continue
+                union = _union(box, tile)
+                if union[2] - union[0] <= max_degrees and union[3] - union[1] <= max_degrees:
+                    result[i] = union
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        tiles = result
+    return tiles
+
+
+def plan_queries(points: Iterable[Tuple[float, float]], radius_km: float, tiles_per_query: int = 8,
+                 max_tile_degrees: float = MAX_TILE_DEGREES) -> List[List[BBox]]:
+    """
+    Group the search boxes around many points into a few bulk queries: overlapping
+    boxes become one tile (up to max_tile_degrees on a side) and each query carries
+    up to tiles_per_query tiles.
+    """
+    tiles = merge_bboxes((bbox_around(lat, lon, radius_km) for lat, lon in points), max_tile_degrees)
+    return [tiles[i:i + tiles_per_query] for i in range(0, len(tiles), tiles_per_query)]
+
+
+def iter_json_elements(chunks: Iterable[bytes]) -> Iterator[Dict]:
+    """
+    Yield the objects of an Overpass JSON "elements" array as the bytes arrive,
+    holding at most one chunk plus one partial element in memory.
+    Raises ValueError if the response ends before the array is closed.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    in_array = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        if not in_array:
+            match = _ELEMENTS_START.search(buffer)
+            if match is None:
+                continue
+            pos = match.end()
+            in_array = True
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element continues in the next chunk
+                break
+            yield element
+    raise ValueError("Overpass response ended before the elements array was complete")
+
+
+def stream_elements(response, chunk_size: int = 64 * 1024) -> Iterator[Dict]:
+    """Stream-parse the elements of an Overpass response opened with stream=True, then close it"""
+    try:
+        yield from iter_json_elements(response.iter_content(chunk_size=chunk_size))
+    finally:
+        response.close()
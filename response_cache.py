@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def make_version(*parts) -> str:
+    """Short, process-independent fingerprint of everything a response depends on"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+class CachedResponse:
+    """A rendered body plus its compressed variants, created lazily and kept for the life of the version"""
+
+    __slots__ = ('version', 'body', 'mimetype', 'last_modified', 'encoded')
+
+    def __init__(self, version: str, body: bytes, mimetype: str, last_modified: float):
+        self.version = version
+        self.body = body
+        self.mimetype = mimetype
+        self.last_modified = last_modified
+        self.encoded: Dict[str, bytes] = {}
+
+    def encode(self, encoding: str) -> bytes:
+        data = self.encoded.get(encoding)
+        if data is None:
+            if encoding == 'br':
+                data = brotli.compress(self.body, quality=11)
+            else:
+                data = gzip.compress(self.body, compresslevel=9, mtime=0)
+            self.encoded[encoding] = data
+        return data
+
+
+class ResponseCache:
+    """
+    Rendered HTML/JSON responses keyed by route and city, valid for one snapshot version.
+
+    A lookup with the version the entry was rendered for returns the stored
+    bytes without touching the template; a new version re-renders once and
+    replaces the entry. Responses carry a weak ETag (the version) and
+    Last-Modified, answer conditional requests with 304 and serve gzip or
+    brotli bodies that were compressed once per version.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.renders = 0
+        self.not_modified = 0
+
+    def get(self, key: Hashable, version: str, render: Callable[[], bytes], mimetype: str = 'text/html') -> CachedResponse:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        body = render()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        entry = CachedResponse(version, body, mimetype, time.time())
+        with self._lock:
+            self.renders += 1
+            if self.max_entries > 0:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, entry: CachedResponse, request: Request) -> Response:
+        """Build the response for a request: 304 if the client is current, else the best stored encoding"""
+        response = Response(mimetype=entry.mimetype)
+        response.set_etag(entry.version, weak=True)
+        response.last_modified = entry.last_modified
+        response.headers['Cache-Control'] = 'public, no-cache'
+        response.vary.add('Accept-Encoding')
+
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(entry.version)
+        else:
+            fresh = request.if_modified_since is not None and \
+                request.if_modified_since.timestamp() >= int(entry.last_modified)
+        if fresh:
+            with self._lock:
+                self.not_modified += 1
+            response.status_code = 304
+            return response
+
+        # Images are already compressed
+        encoding = None if entry.mimetype.startswith('image/') else self.choose_encoding(request, len(entry.body))
+        if encoding:
+            response.set_data(entry.encode(encoding))
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response.set_data(entry.body)
+        return response
+
+    @staticmethod
+    def choose_encoding(request: Request, size: int) -> Optional[str]:
+        if size < MIN_COMPRESS_SIZE:
+            return None
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.renders
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'renders': self.renders,
+                'not_modified': self.not_modified,
+                'hit_ratio': round(self.hits / total, 3) if total else None,
+                'brotli': brotli is not None,
+            }
@@ -0,0 +1,195 @@
+"""
+Region-wide storm risk interpolated from the city observations onto a lat/lon grid.
+
+Humidity, wind speed and pressure are spread over the grid with inverse
+distance weighting, and each cell is scored with the same thresholds as the
+city pages (storm_scoring.score_batch) using the coast of its nearest city.
+A grid is built once per weather refresh; map tiles and the binary download
+are cut from it without rescoring anything.
+
+Binary layout (little endian): GRID_HEADER (magic, rows, cols, south, west,
+step), then rows * cols probability bytes and rows * cols category bytes, row
+0 being the southern-most row. Categories index CATEGORY_LEVELS / PALETTE and
+NO_DATA marks cells too far from every observation to say anything about.
+"""
+import math
+import struct
+import zlib
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from geo import distance_matrix
+from storm_scoring import ALERT_COLORS, RISK_LEVELS, WEST_LOW_COLOR, score_batch
+
+GRID_MAGIC = b'RGD1'
+GRID_HEADER = struct.Struct('<4sIIddd')
+
+NO_DATA = 255
+
+# Risk level per category; West Coast "Low" gets its own category for its amber color
+CATEGORY_LEVELS = RISK_LEVELS + ('Low',)
+PALETTE = tuple(ALERT_COLORS[level] for level in RISK_LEVELS) + (WEST_LOW_COLOR,)
+
+TILE_SIZE = 256
+TILE_ALPHA = 150
+
+# Cell x station distances held in memory at once
+IDW_CHUNK_CELLS = 4_000_000
+
+# (lat, lon, coast, humidity, wind_speed, pressure)
+Station = Tuple[float, float, str, float, float, float]
+
+_RGBA = np.zeros((256, 4), dtype=np.uint8)
+for _code, _color in enumerate(PALETTE):
+    _RGBA[_code] = [int(_color[i:i + 2], 16) for i in (1, 3, 5)] + [TILE_ALPHA]
+
+
+class RiskGrid:
+    """Storm probability and risk category per grid cell, plus the tiles cut from them"""
+
+    def __init__(self, south: float, west: float, step: float,
+                 probability: np.ndarray, category: np.ndarray, version: str = ''):
+        self.south = south
+        self.west = west
+        self.step = step
+        self.probability = probability
+        self.category = category
+        self.version = version
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.probability.shape
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(south, west, north, east) of the outer cell edges"""
+        rows, cols = self.shape
+        return self.south, self.west, self.south + rows * self.step, self.west + cols * self.step
+
+    def to_bytes(self) -> bytes:
+        rows, cols = self.shape
+        header = GRID_HEADER.pack(GRID_MAGIC, rows, cols, self.south, self.west, self.step)
+        return header + self.probability.tobytes() + self.category.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, version: str = '') -> 'RiskGrid':
+        """Inverse of to_bytes; the planes are views into data, not copies"""
+        magic, rows, cols, south, west, step = GRID_HEADER.unpack_from(data, 0)
+        if magic != GRID_MAGIC:
+            raise ValueError("Not a risk grid")
+        cells = rows * cols
+        probability = np.frombuffer(data, dtype=np.uint8, count=cells, offset=GRID_HEADER.size)
+        category = np.frombuffer(data, dtype=np.uint8, count=cells, offset=GRID_HEADER.size + cells)
+        return cls(south, west, step, probability.reshape(rows, cols), category.reshape(rows, cols), version)
+
+    def cells(self, lats, lons) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(rows, cols, inside) of the cells holding each point"""
+        rows, cols = self.shape
+        r = np.floor((np.asarray(lats) - self.south) / self.step).astype(np.int64)
+        c = np.floor((np.asarray(lons) - self.west) / self.step).astype(np.int64)
+        inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+        return np.clip(r, 0, rows - 1), np.clip(c, 0, cols - 1), inside
+
+    def at(self, lat: float, lon: float) -> Optional[dict]:
+        """Probability and risk level of the cell holding a point, or None outside the data"""
+        r, c, inside = self.cells(lat, lon)
+        if not inside or self.category[r, c] == NO_DATA:
+            return None
+        code = int(self.category[r, c])
+        return {'probability': int(self.probability[r, c]), 'risk_level': CATEGORY_LEVELS[code], 'alert_color': PALETTE[code]}
+
+    def render_tile(self, z: int, x: int, y: int, size: int = TILE_SIZE) -> bytes:
+        """Web Mercator (slippy map) tile z/x/y as a PNG, transparent where there is no data"""
+        n = 2 ** z
+        pixels = (np.arange(size) + 0.5) / size
+        lons = (x + pixels) / n * 360.0 - 180.0
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + pixels) / n))))
+
+        r, rows_inside = self._axis(lats, self.south, self.shape[0])
+        c, cols_inside = self._axis(lons, self.west, self.shape[1])
+        category = self.category[np.ix_(r, c)]
+        category = np.where(rows_inside[:, None] & cols_inside[None, :], category, NO_DATA)
+        return encode_png(_RGBA[category])
+
+    def _axis(self, values: np.ndarray, origin: float, length: int) -> Tuple[np.ndarray, np.ndarray]:
+        index = np.floor((values - origin) / self.step).astype(np.int64)
+        inside = (index >= 0) & (index < length)
+        return np.clip(index, 0, length - 1), inside
+
+
+def tile_in_range(z: int, x: int, y: int, max_zoom: int) -> bool:
+    return 0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal RGBA PNG encoder (no filtering, zlib level 6)"""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)),
+        chunk(b'IEND', b''),
+    ))
+
+
+def grid_bounds(points: Iterable[Tuple[float, float]], margin: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) around points plus margin degrees"""
+    lats, lons = zip(*points)
+    return min(lats) - margin, min(lons) - margin, max(lats) + margin, max(lons) + margin
+
+
+def build_grid(stations: Iterable[Station], bounds: Tuple[float, float, float, float], step: float,
+               power: float = 2.0, max_distance_km: float = 150.0, version: str = '') -> RiskGrid:
+    """
+    Interpolate station observations onto the grid with inverse distance
+    weighting and score every cell. Cells farther than max_distance_km from
+    all stations are NO_DATA.
+    """
+    stations = list(stations)
+    south, west, north, east = bounds
+    rows = max(1, math.ceil((north - south) / step))
+    cols = max(1, math.ceil((east - west) / step))
+    probability = np.zeros(rows * cols, dtype=np.uint8)
+    category = np.full(rows * cols, NO_DATA, dtype=np.uint8)
+    if not stations:
+        return RiskGrid(south, west, step, probability.reshape(rows, cols), category.reshape(rows, cols), version)
+
+    lats, lons, coasts, humidity, wind, pressure = zip(*stations)
+    values = np.array([humidity, wind, pressure], dtype=np.float64)
+    coasts = np.array(coasts, dtype=object)
+
+    cell_lats = np.repeat(south + (np.arange(rows) + 0.5) * step, cols)
+    cell_lons = np.tile(west + (np.arange(cols) + 0.5) * step, rows)
+
+    chunk = max(1, IDW_CHUNK_CELLS // len(stations))
+    for start in range(0, rows * cols, chunk):
+        end = min(start + chunk, rows * cols)
+        distances = distance_matrix(cell_lats[start:end], cell_lons[start:end], lats, lons)
+        nearest = distances.argmin(axis=1)
+        covered = distances[np.arange(end - start), nearest] <= max_distance_km
+        if not covered.any():
+            continue
+
+        distances = distances[covered]
+        # A cell centred on a station takes its values exactly
+        weights = 1.0 / np.maximum(distances, 1e-6) ** power
+        h, w, p = (weights @ values.T / weights.sum(axis=1)[:, None]).T
+        cell_coasts = coasts[nearest[covered]]
+        scores = score_batch(h, w, p, cell_coasts)
+
+        codes = np.empty(len(h), dtype=np.uint8)
+        for code, level in enumerate(RISK_LEVELS):
+            codes[scores['risk_level'] == level] = code
+        codes[(scores['risk_level'] == 'Low') & (cell_coasts != 'East Coast')] = len(RISK_LEVELS)
+        index = np.arange(start, end)[covered]
+        probability[index] = scores['probability']
+        category[index] = codes
+
+    return RiskGrid(south, west, step, probability.reshape(rows, cols), category.reshape(rows, cols), version)
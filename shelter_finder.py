@@ -1,136 +1,222 @@
-import requests
-import math
-from typing import List, Dict
+import heapq
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import http_client
+from geo import haversine_km, haversine_many
+from overpass import OVERPASS_URL, SHELTER_AMENITIES, bbox_around, shelter_query, stream_elements
+
+logger = logging.getLogger(__name__)
+
+# Elements whose distances are computed together while streaming a response
+DISTANCE_CHUNK = 2048
+
+# Typical (min, max) people per building type when OSM has no capacity or beds tag
+CAPACITY_RANGES = {
+    'hospital': (200, 500),
+    'school': (300, 800),
+    'community_centre': (150, 400),
+    'place_of_worship': (100, 300),
+    'townhall': (100, 250),
+    'social_facility': (50, 150),
+}
+DEFAULT_CAPACITY_RANGE = (100, 200)
+
+# Thousands separators inside a number ("1,200", "1_200", "1 200")
+_DIGIT_SEPARATORS = re.compile(r'(?<=\d)[,_ ](?=\d)')
+# A number, or an explicit range joined by a hyphen or en dash
+_CAPACITY = re.compile(r'(\d+)(?:\s*[-\u2013]\s*(\d+))?')
+
+
+def parse_capacity(text) -> Optional[Tuple[int, int]]:
+    """
+    (min, max) from a capacity such as 300, "450", "1,200", "300-800 people" or "~200"; None if there is
+    no number. Only a hyphen or en dash makes a range; other text after the first number is ignored.
+    """
+    match = _CAPACITY.search(_DIGIT_SEPARATORS.sub('', str(text)))
+    if not match:
+        return None
+    numbers = [int(n) for n in match.groups() if n is not None]
+    return min(numbers), max(numbers)
+
+
+def capacity_range(shelter: Dict) -> Tuple[int, int]:
+    """
+    (min, max) capacity of a shelter dict, parsing the display string for entries stored before it had
+    numeric bounds. A single given bound is used for both.
+    """
+    if 'capacity_min' in shelter or 'capacity_max' in shelter:
+        low = shelter.get('capacity_min', shelter.get('capacity_max'))
+        return low, shelter.get('capacity_max', low)
+    return parse_capacity(shelter.get('capacity', '')) or DEFAULT_CAPACITY_RANGE
+
+
+class ShelterCandidate:
+    """A shelter that is still in the running: just enough to rank it and build its dict later"""
+    __slots__ = ('distance', 'lat', 'lon', 'tags')
+
+    def __init__(self, distance: float, lat: float, lon: float, tags: Dict):
+        self.distance = distance
+        self.lat = lat
+        self.lon = lon
+        self.tags = tags
+
 
 class ShelterFinder:
     """
     Finds potential emergency shelters near coastal areas using OpenStreetMap Overpass API
     """
     
-    def __init__(self):
-        self.overpass_url = "https://overpass-api.de/api/interpreter"
+    def __init__(self, client: Optional[http_client.UpstreamClient] = None, index=None):
+        self.overpass_url = OVERPASS_URL
+        self.client = client or http_client.overpass
+        # Optional offline spatial_index.ShelterIndex; when set, no Overpass queries are made
+        self.index = index
     
     def haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two points in kilometers"""
-        R = 6371  # Earth's radius in km
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return R * c
+        return haversine_km(lat1, lon1, lat2, lon2)
     
-    def get_shelters_near_location(self, lat: float, lon: float, radius_km: float = 5) -> List[Dict]:
+    def get_shelters_near_location(self, lat: float, lon: float, radius_km: float = 5, limit: int = 12,
+                                   raise_errors: bool = False) -> List[Dict]:
         """
-        Fetch potential emergency shelters within radius_km of the given coordinates
+        Fetch potential emergency shelters within radius_km of the given coordinates.
+        Overpass failures return [] unless raise_errors is set.
         """
-        
-        # Calculate bounding box
-        lat_delta = radius_km / 111.0
-        lon_delta = radius_km / (111.0 * math.cos(math.radians(lat)))
-        
-        bbox = f"{lat - lat_delta},{lon - lon_delta},{lat + lat_delta},{lon + lon_delta}"
+        if self.index is not None:
+            return [
+                dict(shelter, distance=f"{distance:.1f}")
+                for distance, shelter in self.index.within(lat, lon, radius_km, limit=limit)
+            ]
         
         # Overpass QL query to find potential shelters
-        overpass_query = f"""
-        [out:json][timeout:25];
-        (
-          node["amenity"="hospital"]({bbox});
-          way["amenity"="hospital"]({bbox});
-          node["amenity"="school"]({bbox});
-          way["amenity"="school"]({bbox});
-          node["amenity"="community_centre"]({bbox});
-          way["amenity"="community_centre"]({bbox});
-          node["amenity"="social_facility"]({bbox});
-          way["amenity"="social_facility"]({bbox});
-          node["amenity"="place_of_worship"]({bbox});
-          way["amenity"="place_of_worship"]({bbox});
-          node["amenity"="townhall"]({bbox});
-          way["amenity"="townhall"]({bbox});
-          node["building"="civic"]({bbox});
-          way["building"="civic"]({bbox});
-        );
-        out center;
-        """
+        overpass_query = shelter_query([bbox_around(lat, lon, radius_km)])
         
         try:
-            response = requests.post(
+            response = self.client.post(
                 self.overpass_url,
                 data={'data': overpass_query},
-                timeout=30
+                stream=True
             )
-            response.raise_for_status()
-            data = response.json()
+            if not response.ok:
+                response.close()
+                response.raise_for_status()
             
+            # Keep the top shelters (12 by default) to avoid clutter, building dicts only for those
             shelters = []
-            seen_locations = set()
-            
-            for element in data.get('elements', []):
-                # Get coordinates
-                if element['type'] == 'node':
-                    shelter_lat = element['lat']
-                    shelter_lon = element['lon']
-                elif 'center' in element:
-                    shelter_lat = element['center']['lat']
-                    shelter_lon = element['center']['lon']
-                else:
-                    continue
-                
-                # Calculate actual distance
-                distance = self.haversine_distance(lat, lon, shelter_lat, shelter_lon)
-                
-                # Only include if within radius and not duplicate
-                location_key = f"{shelter_lat:.4f},{shelter_lon:.4f}"
-                if distance <= radius_km and location_key not in seen_locations:
-                    seen_locations.add(location_key)
-                    
-                    tags = element.get('tags', {})
-                    amenity = tags.get('amenity', 'building')
-                    
-                    # Determine shelter type and icon
-                    shelter_type, icon = self._get_shelter_type_and_icon(amenity, tags)
-                    
-                    # Get name or generate one
-                    name = tags.get('name', f"{shelter_type.title()} Facility")
-                    
-                    # Estimate capacity based on type
-                    capacity = self._estimate_capacity(amenity, tags)
-                    
-                    # Determine facilities available
-                    facilities = self._determine_facilities(amenity, tags)
-                    
-                    # Generate address
-                    address = self._generate_address(tags, shelter_lat, shelter_lon)
-                    
-                    shelter = {
-                        'name': name,
-                        'address': address,
-                        'lat': shelter_lat,
-                        'lon': shelter_lon,
-                        'capacity': capacity,
-                        'distance': f"{distance:.1f}",
-                        'phone': tags.get('phone', 'Contact local authorities'),
-                        'icon': icon,
-                        'facilities': facilities,
-                        'type': shelter_type
-                    }
-                    
-                    shelters.append(shelter)
-            
-            # Sort by distance
-            shelters.sort(key=lambda x: float(x['distance']))
-            
-            # Limit to top 12 shelters to avoid clutter
-            return shelters[:12]
+            for candidate in self.nearest_candidates(lat, lon, radius_km, limit, stream_elements(response)):
+                shelter = self.build_shelter(candidate.tags, candidate.lat, candidate.lon)
+                shelter['distance'] = f"{candidate.distance:.1f}"
+                shelters.append(shelter)
+            return shelters
             
         except Exception as e:
-            print(f"Error fetching shelters: {e}")
+            logger.warning("Error fetching shelters: %s", e)
+            if raise_errors:
+                raise
             return []
     
+    def nearest_candidates(self, lat: float, lon: float, radius_km: float, limit: int,
+                           elements: Iterable[Dict]) -> List[ShelterCandidate]:
+        """
+        The limit closest distinct locations within radius_km, closest first.
+
+        Elements are consumed as they stream in: distances are computed a chunk at
+        a time and only a bounded heap of candidates is kept, so memory does not
+        grow with the response beyond the location keys seen inside the radius.
+        Duplicate locations keep their first occurrence and equal distances keep
+        element order.
+        """
+        heap = []
+        seen_locations = set()
+        seen = 0
+        tags, lats, lons = [], [], []
+
+        def flush():
+            distances = haversine_many(lat, lon, lats, lons)
+            for i in np.flatnonzero(distances <= radius_km):
+                location_key = f"{lats[i]:.4f},{lons[i]:.4f}"
+                if location_key in seen_locations:
+                    continue
+                seen_locations.add(location_key)
+                distance = float(distances[i])
+                # Max-heap on (distance, arrival order): the root is the current worst winner
+                if len(heap) < limit:
+                    heapq.heappush(heap, (-distance, -(seen + i), ShelterCandidate(distance, lats[i], lons[i], tags[i])))
+                elif limit and distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, -(seen + i), ShelterCandidate(distance, lats[i], lons[i], tags[i])))
+
+        for element in elements:
+            coords = self.element_coordinates(element)
+            if coords is None:
+                continue
+            tags.append(element.get('tags', {}))
+            lats.append(coords[0])
+            lons.append(coords[1])
+            if len(lats) == DISTANCE_CHUNK:
+                flush()
+                seen += len(lats)
+                tags, lats, lons = [], [], []
+        if lats:
+            flush()
+
+        return [candidate for _, _, candidate in sorted(heap, reverse=True)]
+    
+    def nearest_shelters(self, lat: float, lon: float, k: int = 5, radius_km: float = 10) -> List[Dict]:
+        """
+        Up to k shelters nearest to an arbitrary coordinate, closest first (without distance).
+        Uses the offline index when loaded, otherwise a live Overpass query within radius_km,
+        whose failures are raised rather than reported as no shelters.
+        """
+        if self.index is not None:
+            return [shelter for _, shelter in self.index.nearest(lat, lon, k=k, max_distance_km=radius_km)]
+        shelters = self.get_shelters_near_location(lat, lon, radius_km=radius_km, limit=k, raise_errors=True)
+        for shelter in shelters:
+            del shelter['distance']
+        return shelters
+    
+    @staticmethod
+    def element_coordinates(element: Dict) -> Optional[tuple]:
+        """(lat, lon) of an Overpass element: node position or way/relation center"""
+        if element['type'] == 'node':
+            return element['lat'], element['lon']
+        if 'center' in element:
+            return element['center']['lat'], element['center']['lon']
+        return None
+    
+    def build_shelter(self, tags: Dict, lat: float, lon: float) -> Dict:
+        """Build the shelter dict for an OSM feature (without distance)"""
+        amenity = tags.get('amenity', 'building')
+        
+        # Determine shelter type and icon
+        shelter_type, icon = self._get_shelter_type_and_icon(amenity, tags)
+        capacity = self._capacity_range(amenity, tags)
+        
+        # Get name or generate one
+        name = tags.get('name', f"{shelter_type.title()} Facility")
+        
+        return {
+            'name': name,
+            'address': self._generate_address(tags, lat, lon),
+            'lat': lat,
+            'lon': lon,
+            'capacity': self._estimate_capacity(amenity, tags),
+            'capacity_min': capacity[0],
+            'capacity_max': capacity[1],
+            'phone': tags.get('phone', 'Contact local authorities'),
+            'icon': icon,
+            'facilities': self._determine_facilities(amenity, tags),
+            'type': shelter_type
+        }
+    
+    @staticmethod
+    def is_shelter(tags: Dict) -> bool:
+        """Whether an OSM feature's tags match one of the shelter categories we query for"""
+        return tags.get('amenity') in SHELTER_AMENITIES or tags.get('building') == 'civic'
+    
     def _get_shelter_type_and_icon(self, amenity: str, tags: Dict) -> tuple:
         """Determine shelter type and appropriate icon"""
         type_map = {
@@ -158,16 +244,17 @@ class ShelterFinder:
         if 'beds' in tags:
             return f"{tags['beds']} beds"
         
-        capacity_map = {
-            'hospital': '200-500 people',
-            'school': '300-800 people',
-            'community_centre': '150-400 people',
-            'place_of_worship': '100-300 people',
-            'townhall': '100-250 people',
-            'social_facility': '50-150 people',
-        }
-        
-        return capacity_map.get(amenity, '100-200 people')
+        low, high = CAPACITY_RANGES.get(amenity, DEFAULT_CAPACITY_RANGE)
+        return f"{low}-{high} people"
+    
+    def _capacity_range(self, amenity: str, tags: Dict) -> Tuple[int, int]:
+        """Numeric (min, max) people, from the capacity or beds tag when they hold a number"""
+        for key in ('capacity', 'beds'):
+            if key in tags:
+                tagged = parse_capacity(tags[key])
+                if tagged:
+                    return tagged
+        return CAPACITY_RANGES.get(amenity, DEFAULT_CAPACITY_RANGE)
     
     def _determine_facilities(self, amenity: str, tags: Dict) -> List[str]:
         """Determine available facilities based on shelter type"""
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class ShelterStore:
+    """
+    Persistent shelter cache backed by SQLite, keyed by location and radius.
+
+    The database runs in WAL mode so every worker process on the host can read
+    and write the same file; entries expire after their TTL but are kept so a
+    stale result can still be served when Overpass is unavailable.
+    """
+
+    def __init__(self, path: str = 'shelters.db', ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS shelters (
+                    key TEXT PRIMARY KEY,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    radius_km REAL NOT NULL,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def make_key(lat: float, lon: float, radius_km: float) -> str:
+        return f"{lat:.4f},{lon:.4f},{radius_km:g}"
+
+    def get_entry(self, lat: float, lon: float, radius_km: float) -> Optional[Tuple[List[Dict], float, bool]]:
+        """Return (shelters, fetched_at, expired) for a location, or None if never stored"""
+        row = self._connect().execute(
+            'SELECT data, fetched_at, expires_at FROM shelters WHERE key = ?',
+            (self.make_key(lat, lon, radius_km),)
+        ).fetchone()
+        if row is None:
+            return None
+        data, fetched_at, expires_at = row
+        return json.loads(data), fetched_at, expires_at <= time.time()
+
+    def get(self, lat: float, lon: float, radius_km: float) -> Optional[List[Dict]]:
+        """Return unexpired shelters for a location, or None"""
+        entry = self.get_entry(lat, lon, radius_km)
+        if entry is None or entry[2]:
+            return None
+        return entry[0]
+
+    def put(self, lat: float, lon: float, radius_km: float, shelters: List[Dict], ttl: Optional[float] = None) -> None:
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO shelters (key, lat, lon, radius_km, data, fetched_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.make_key(lat, lon, radius_km), lat, lon, radius_km, json.dumps(shelters),
+                 now, now + (self.ttl if ttl is None else ttl))
+            )
+
+    def claim_refresh(self, lat: float, lon: float, radius_km: float, backoff: float) -> bool:
+        """
+        Atomically push an expired entry's expiry backoff seconds ahead, keeping its shelters.
+        Returns True for the one caller (across threads and processes) that should refresh it;
+        if that refresh fails the entry simply stays stamped until the backoff runs out.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'UPDATE shelters SET expires_at = ? WHERE key = ? AND expires_at <= ?',
+                (now + backoff, self.make_key(lat, lon, radius_km), now)
+            )
+        return cursor.rowcount == 1
+
+    def purge_expired(self, older_than: float = 0) -> int:
+        """Delete entries that expired more than older_than seconds ago"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute('DELETE FROM shelters WHERE expires_at < ?', (time.time() - older_than,))
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        total, expired = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(expires_at <= ?), 0) FROM shelters', (time.time(),)
+        ).fetchone()
+        return {'path': self.path, 'entries': total, 'expired': expired, 'ttl': self.ttl}
@@ -0,0 +1,230 @@
+"""
+Host-wide snapshot store in POSIX shared memory.
+
+One refresher process writes the weather, storm and shelter snapshot of every
+city; each worker maps the same segment and decodes a payload only when its
+version changes, so the whole host makes one upstream call per city per
+interval and workers keep a single decoded copy each.
+
+Layout: a 64-byte header followed by two equal payload slots. The writer fills
+the slot readers are not using, then flips the active slot and bumps the
+version. A sequence counter (odd while a write is in progress) lets readers
+detect the rare case of a slot being rewritten under them and retry: a slot is
+only reused two writes after it stopped being active. Payloads are marshal
+dumps of plain dicts, lists, strings and numbers. There must be a single writer.
+
+Reads are not zero-copy: each worker decodes a new version into its own
+objects. Views into the segment would be overwritten once their slot is reused,
+and while any view is alive the mapping cannot be closed or re-attached. The
+payload is small (18 cities and a ~250 KB risk grid at the default step), so a
+copy per worker costs little and only one decode happens per version.
+
+The segment outlives the refresher, so a restarted refresher takes it over and
+workers keep serving the last payload meanwhile; call unlink() (or remove
+/dev/shm/<name>) to get rid of it.
+"""
+import marshal
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Optional
+
+MAGIC = b'SNP1'
+
+# magic, slot size, sequence, version, active slot, payload length of slot 0 and 1
+HEADER = struct.Struct('<4sIQQI2I')
+HEADER_SIZE = 64
+SEQ_OFFSET = 8
+VERSION_OFFSET = 16
+ACTIVE_OFFSET = 24
+LENGTHS_OFFSET = 28
+
+READ_ATTEMPTS = 50
+
+
+def _open(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    """
+    Open or create a segment without handing it to the resource tracker, which
+    would otherwise unlink it when this process exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:  # Python < 3.13 has no track argument and always tracks
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedSnapshotStore:
+    """Double-buffered, seqlock-guarded payload in a named shared memory segment"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        magic, self.slot_size = HEADER.unpack_from(shm.buf, 0)[:2]
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory segment {shm.name} is not a snapshot store")
+        self._version = 0
+        self._payload = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, name: str, slot_size: int = 2 * 1024 * 1024) -> 'SharedSnapshotStore':
+        """Create (or take over) the segment as its writer"""
+        try:
+            shm = _open(name, create=True, size=HEADER_SIZE + 2 * slot_size)
+        except FileExistsError:
+            # Left behind by a previous refresher; reuse it if it is big enough
+            shm = _open(name)
+            if shm.size < HEADER_SIZE + 2 * slot_size:
+                shm.close()
+                raise ValueError(f"Existing segment {name} is smaller than {2 * slot_size} bytes; remove it first")
+            magic, existing_slot_size = HEADER.unpack_from(shm.buf, 0)[:2]
+            if magic == MAGIC and existing_slot_size == slot_size:
+                # Keep the header so attached workers carry on with the last payload
+                return cls(shm, owner=True)
+            HEADER.pack_into(shm.buf, 0, MAGIC, slot_size, 0, 0, 0, 0, 0)
+            return cls(shm, owner=True)
+        HEADER.pack_into(shm.buf, 0, MAGIC, slot_size, 0, 0, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedSnapshotStore':
+        return cls(_open(name))
+
+    def write(self, payload: Dict[str, Any]) -> int:
+        """Publish a new payload; returns its version"""
+        data = marshal.dumps(payload)
+        if len(data) > self.slot_size:
+            raise ValueError(f"Snapshot of {len(data)} bytes does not fit a {self.slot_size} byte slot")
+        buf = self.shm.buf
+        _, _, seq, version, active, *_ = HEADER.unpack_from(buf, 0)
+        slot = 1 - active
+        offset = HEADER_SIZE + slot * self.slot_size
+
+        struct.pack_into('<Q', buf, SEQ_OFFSET, seq + 1)
+        buf[offset:offset + len(data)] = data
+        struct.pack_into('<I', buf, LENGTHS_OFFSET + 4 * slot, len(data))
+        struct.pack_into('<QI', buf, VERSION_OFFSET, version + 1, slot)
+        struct.pack_into('<Q', buf, SEQ_OFFSET, seq + 2)
+        return version + 1
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """The latest payload, decoded once per version and shared by callers; None before the first write"""
+        buf = self.shm.buf
+        for _ in range(READ_ATTEMPTS):
+            seq = struct.unpack_from('<Q', buf, SEQ_OFFSET)[0]
+            version, active = struct.unpack_from('<QI', buf, VERSION_OFFSET)
+            if version == 0:
+                return None
+            if version == self._version:
+                return self._payload
+
+            length = struct.unpack_from('<I', buf, LENGTHS_OFFSET + 4 * active)[0]
+            offset = HEADER_SIZE + active * self.slot_size
+            view = buf[offset:offset + length]
+            try:
+                payload = marshal.loads(view)
+            except (EOFError, ValueError, TypeError):
+                payload = None
+            finally:
+                view.release()
+
+            # The slot we read is only rewritten once two more writes have started
+            if payload is not None and struct.unpack_from('<Q', buf, SEQ_OFFSET)[0] - seq <= (1 if seq & 1 else 2):
+                with self._lock:
+                    if version > self._version:
+                        self._version, self._payload = version, payload
+                return payload
+            time.sleep(0.001)
+        return self._payload
+
+    @property
+    def version(self) -> int:
+        return struct.unpack_from('<Q', self.shm.buf, VERSION_OFFSET)[0]
+
+    def close(self) -> None:
+        """Unmap the segment; it stays available to other processes and a restarted writer"""
+        self._payload = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """Remove the segment from the host; processes that still map it keep their view"""
+        if not hasattr(self.shm, '_track'):
+            # Python < 3.13 unregisters on unlink; _open unregistered already
+            resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+
+class SnapshotReader:
+    """
+    Worker-side view of a snapshot store that may not exist yet: attaches lazily,
+    retries every retry_interval seconds and ignores payloads older than max_age.
+    While the payload is stale or the version has not moved for max_age, it
+    re-attaches by name every retry_interval, in case the segment was replaced.
+    """
+
+    def __init__(self, name: str, max_age: float = 900, retry_interval: float = 5):
+        self.name = name
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self._store = None
+        self._next_attempt = 0.0
+        self._version = None
+        self._version_changed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _attach(self, now: float) -> None:
+        with self._lock:
+            if now < self._next_attempt:
+                return
+            self._next_attempt = now + self.retry_interval
+            try:
+                store = SharedSnapshotStore.attach(self.name)
+            except (FileNotFoundError, ValueError):
+                return
+            # The old mapping is left to the garbage collector; payloads already read are copies
+            self._store = store
+            self._version, self._version_changed_at = store.version, now
+
+    def _connect(self) -> Optional[SharedSnapshotStore]:
+        now = time.monotonic()
+        store = self._store
+        if store is None:
+            self._attach(now)
+            return self._store
+        version = store.version
+        if version != self._version:
+            self._version, self._version_changed_at = version, now
+        elif now - self._version_changed_at > self.max_age:
+            self._attach(now)
+        return self._store
+
+    def payload(self) -> Optional[Dict[str, Any]]:
+        store = self._connect()
+        payload = store.read() if store else None
+        if store is not None and self._stale(payload):
+            self._attach(time.monotonic())
+            if self._store is not store:
+                payload = self._store.read()
+        return None if self._stale(payload) else payload
+
+    def _stale(self, payload: Optional[Dict[str, Any]]) -> bool:
+        return payload is None or time.time() - payload['written_at'] > self.max_age
+
+    def get(self, city: str) -> Optional[Dict[str, Any]]:
+        """{'weather', 'storm', 'shelters', 'updated_at'} for a city, or None if unavailable or stale"""
+        payload = self.payload()
+        return payload['cities'].get(city) if payload else None
+
+    def stats(self) -> Dict:
+        store = self._connect()
+        payload = self.payload()
+        return {
+            'name': self.name,
+            'attached': store is not None,
+            'version': store.version if store else None,
+            'cities': len(payload['cities']) if payload else 0,
+            'age': round(time.time() - payload['written_at'], 1) if payload else None,
+        }
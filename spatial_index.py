@@ -0,0 +1,262 @@
+"""
+Offline spatial index of emergency shelters.
+
+Shelters are ingested from Overpass dumps (JSON or XML, queried with "out center")
+or OSM XML extracts and stored as a compact gzipped JSON file. At load time they
+are placed in a KD-tree over unit-sphere (x, y, z) coordinates, where straight-line
+chord distance orders points exactly like great-circle distance, so nearest and
+within-radius queries need no network access.
+
+Large OSM extracts should be pre-filtered (e.g. `osmium tags-filter`) so that
+only shelter features and the nodes they reference are in the file.
+
+    python spatial_index.py build coastal_dump.json kerala.osm -o shelter_index.json.gz
+    python spatial_index.py query shelter_index.json.gz 13.0827 80.2707 -k 5
+
+download_index() builds the same index straight from Overpass with a few bulk
+tiled queries (see overpass.plan_queries), stream-parsing each response.
+"""
+import argparse
+import gzip
+import heapq
+import json
+import math
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import http_client
+from geo import EARTH_RADIUS_KM
+from overpass import BBox, iter_json_elements, shelter_query, stream_elements
+from shelter_finder import ShelterFinder
+
+LEAF_SIZE = 16
+
+
+def to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    return cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad)
+
+
+def km_to_chord(distance_km: float) -> float:
+    """Straight-line distance through the unit sphere for a great-circle distance"""
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * math.asin(min(chord / 2, 1.0)) * EARTH_RADIUS_KM
+
+
+class ShelterIndex:
+    """KD-tree over shelter positions answering k-nearest and within-radius queries"""
+
+    def __init__(self, shelters: List[Dict]):
+        self.shelters = shelters
+        self.points = [to_unit_vector(s['lat'], s['lon']) for s in shelters]
+        self.root = self._build(list(range(len(shelters)))) if shelters else None
+
+    def __len__(self) -> int:
+        return len(self.shelters)
+
+    def _build(self, indices: List[int]):
+        if len(indices) <= LEAF_SIZE:
+            return indices
+        # Split on the axis with the widest spread
+        points = self.points
+        spans = []
+        for axis in range(3):
+            values = [points[i][axis] for i in indices]
+            spans.append(max(values) - min(values))
+        axis = spans.index(max(spans))
+        indices.sort(key=lambda i: points[i][axis])
+        mid = len(indices) // 2
+        split = points[indices[mid]][axis]
+        return (axis, split, self._build(indices[:mid]), self._build(indices[mid:]))
+
+    def nearest(self, lat: float, lon: float, k: int = 5, max_distance_km: Optional[float] = None) -> List[Tuple[float, Dict]]:
+        """The k nearest shelters as (distance_km, shelter) pairs, closest first"""
+        if self.root is None or k <= 0:
+            return []
+        query = to_unit_vector(lat, lon)
+        limit = km_to_chord(max_distance_km) ** 2 if max_distance_km is not None else float('inf')
+        heap = []  # max-heap of (-squared chord, index)
+        points = self.points
+
+        def visit(node):
+            if isinstance(node, list):
+                qx, qy, qz = query
+                for i in node:
+                    px, py, pz = points[i]
+                    d2 = (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2
+                    if d2 > limit:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d2, i))
+                    elif d2 < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d2, i))
+                return
+            axis, split, left, right = node
+            diff = query[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            worst = -heap[0][0] if len(heap) == k else limit
+            if diff * diff <= worst:
+                visit(far)
+
+        visit(self.root)
+        return [(chord_to_km(math.sqrt(-d2)), self.shelters[i]) for d2, i in sorted(heap, reverse=True)]
+
+    def within(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+        """All shelters within radius_km as (distance_km, shelter) pairs, closest first"""
+        if self.root is None:
+            return []
+        query = to_unit_vector(lat, lon)
+        max_d2 = km_to_chord(radius_km) ** 2
+        found = []
+        points = self.points
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                qx, qy, qz = query
+                for i in node:
+                    px, py, pz = points[i]
+                    d2 = (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2
+                    if d2 <= max_d2:
+                        found.append((d2, i))
+                continue
+            axis, split, left, right = node
+            diff = query[axis] - split
+            if diff < 0 or diff * diff <= max_d2:
+                stack.append(left)
+            if diff >= 0 or diff * diff <= max_d2:
+                stack.append(right)
+        found.sort()
+        if limit is not None:
+            found = found[:limit]
+        return [(chord_to_km(math.sqrt(d2)), self.shelters[i]) for d2, i in found]
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump({'version': 1, 'shelters': self.shelters}, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'ShelterIndex':
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls(json.load(f)['shelters'])
+
+
+def iter_overpass_json(path: str) -> Iterator[Dict]:
+    """Elements of an Overpass JSON dump"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        yield from iter_json_elements(iter(lambda: f.read(64 * 1024), b''))
+
+
+def iter_osm_xml(path: str) -> Iterator[Dict]:
+    """
+    Elements of an OSM or Overpass XML file, converted to Overpass JSON shape.
+    Ways without a <center> are placed at the mean of their referenced nodes.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    node_coords = {}
+    with opener(path, 'rb') as f:
+        for _, elem in ET.iterparse(f, events=('end',)):
+            if elem.tag not in ('node', 'way', 'relation'):
+                continue
+            tags = {tag.get('k'): tag.get('v') for tag in elem.findall('tag')}
+            if elem.tag == 'node':
+                lat, lon = float(elem.get('lat')), float(elem.get('lon'))
+                node_coords[elem.get('id')] = (lat, lon)
+                if tags:
+                    yield {'type': 'node', 'lat': lat, 'lon': lon, 'tags': tags}
+            elif tags:
+                center = elem.find('center')
+                if center is not None:
+                    coords = (float(center.get('lat')), float(center.get('lon')))
+                else:
+                    refs = [node_coords[nd.get('ref')] for nd in elem.findall('nd') if nd.get('ref') in node_coords]
+                    if not refs:
+                        elem.clear()
+                        continue
+                    coords = (sum(c[0] for c in refs) / len(refs), sum(c[1] for c in refs) / len(refs))
+                yield {'type': elem.tag, 'center': {'lat': coords[0], 'lon': coords[1]}, 'tags': tags}
+            elem.clear()
+
+
+def iter_elements(path: str) -> Iterator[Dict]:
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith(('.osm', '.xml')):
+        return iter_osm_xml(path)
+    return iter_overpass_json(path)
+
+
+def build_index(paths: Iterable[str], finder: Optional[ShelterFinder] = None) -> ShelterIndex:
+    """Ingest shelters from dump files into a ShelterIndex, dropping duplicate locations"""
+    return index_elements((element for path in paths for element in iter_elements(path)), finder)
+
+
+def download_index(queries: Iterable[List[BBox]], client: Optional[http_client.UpstreamClient] = None,
+                   finder: Optional[ShelterFinder] = None, timeout: int = 180) -> ShelterIndex:
+    """Run bulk shelter queries (lists of tiles) against Overpass and index every result"""
+    client = client or http_client.overpass
+    finder = finder or ShelterFinder(client=client)
+
+    def elements():
+        for tiles in queries:
+            response = client.post(finder.overpass_url, data={'data': shelter_query(tiles, timeout=timeout)},
+                                   stream=True, timeout=(client.timeout[0], timeout + 30))
+            response.raise_for_status()
+            yield from stream_elements(response)
+
+    return index_elements(elements(), finder)
+
+
+def index_elements(elements: Iterable[Dict], finder: Optional[ShelterFinder] = None) -> ShelterIndex:
+    """Build a ShelterIndex from OSM elements, dropping non-shelters and duplicate locations"""
+    finder = finder or ShelterFinder()
+    shelters = []
+    seen_locations = set()
+    for element in elements:
+        tags = element.get('tags', {})
+        if not finder.is_shelter(tags):
+            continue
+        coords = finder.element_coordinates(element)
+        if coords is None:
+            continue
+        location_key = f"{coords[0]:.4f},{coords[1]:.4f}"
+        if location_key in seen_locations:
+            continue
+        seen_locations.add(location_key)
+        shelters.append(finder.build_shelter(tags, coords[0], coords[1]))
+    return ShelterIndex(shelters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the offline shelter index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Ingest Overpass/OSM dumps into an index file')
+    build.add_argument('inputs', nargs='+', help='Overpass JSON or OSM/Overpass XML files (optionally .gz)')
+    build.add_argument('-o', '--output', default='shelter_index.json.gz')
+
+    query = subparsers.add_parser('query', help='Print the nearest shelters to a coordinate')
+    query.add_argument('index')
+    query.add_argument('lat', type=float)
+    query.add_argument('lon', type=float)
+    query.add_argument('-k', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        index = build_index(args.inputs)
+        index.save(args.output)
+        print(f"Indexed {len(index)} shelters into {args.output}")
+    else:
+        index = ShelterIndex.load(args.index)
+        for distance, shelter in index.nearest(args.lat, args.lon, k=args.k):
+            print(f"{distance:6.2f} km  {shelter['name']} ({shelter['type']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import numpy as np
+
+RISK_LEVELS = ('Critical', 'High', 'Moderate', 'Low', 'Very Low')
+
+ALERT_COLORS = {
+    'Critical': '#dc2626',
+    'High': '#ef4444',
+    'Moderate': '#f97316',
+    'Low': '#10b981',
+    'Very Low': '#10b981',
+}
+
+# West Coast "Low" is shown in amber rather than green
+WEST_LOW_COLOR = '#eab308'
+
+STORM_TYPES = (
+    "Severe Cyclonic Storm",
+    "Tropical Storm",
+    "Thunderstorm with Heavy Rain",
+    "Moderate Thunderstorm",
+    "Light Rain Showers",
+)
+
+RAINFALL_TYPES = (
+    "Heavy to Very Heavy Rain (115-204 mm)",
+    "Heavy Rain (64.5-115.5 mm)",
+    "Moderate Rain (35.5-64.4 mm)",
+    "Light Rain (2.5-15.5 mm)",
+    "Very Light Rain (<2.5 mm)",
+)
+
+RECOMMENDATIONS = {
+    'Critical': 'URGENT: Evacuate coastal areas immediately. Seek shelter inland. Avoid all travel. Severe storm conditions imminent.',
+    'High': 'Secure all loose objects, avoid coastal areas and sea travel. Stay indoors and monitor emergency updates continuously.',
+    'Moderate': 'Stay alert and avoid unnecessary travel near coast. Keep emergency supplies ready. Monitor weather updates.',
+    'Low': 'Normal precautions. Keep umbrella handy. Avoid prolonged exposure to rain.',
+    'Very Low': 'No significant precautions needed. Enjoy your day with minimal weather concerns.'
+}
+
+
+def assess_risk(humidity, wind_speed, pressure, coast):
+    """Storm probability, risk level and alert color for one location"""
+    if coast == 'East Coast':
+        if humidity >= 85 and wind_speed >= 12:
+            probability = min(95, int(humidity * 0.6 + wind_speed * 3.5 + (1010 - pressure) * 0.5))
+            risk_level = 'Critical'
+            alert_color = '#dc2626'
+        elif humidity >= 75 and wind_speed >= 8:
+            probability = min(70, int(humidity * 0.4 + wind_speed * 2.5))
+            risk_level = 'High'
+            alert_color = '#ef4444'
+        elif humidity >= 65 and wind_speed >= 5:
+            probability = min(45, int(humidity * 0.3 + wind_speed * 1.5))
+            risk_level = 'Moderate'
+            alert_color = '#f97316'
+        else:
+            probability = min(25, int(humidity * 0.2 + wind_speed * 0.8))
+            risk_level = 'Low'
+            alert_color = '#10b981'
+    else:  # West Coast
+        if humidity >= 90 and wind_speed >= 15:
+            probability = min(85, int(humidity * 0.5 + wind_speed * 3 + (1010 - pressure) * 0.4))
+            risk_level = 'High'
+            alert_color = '#ef4444'
+        elif humidity >= 80 and wind_speed >= 10:
+            probability = min(60, int(humidity * 0.35 + wind_speed * 2))
+            risk_level = 'Moderate'
+            alert_color = '#f97316'
+        elif humidity >= 70 and wind_speed >= 6:
+            probability = min(35, int(humidity * 0.25 + wind_speed * 1.2))
+            risk_level = 'Low'
+            alert_color = '#eab308'
+        else:
+            probability = min(15, int(humidity * 0.15 + wind_speed * 0.5))
+            risk_level = 'Very Low'
+            alert_color = '#10b981'
+    return probability, risk_level, alert_color
+
+
+def determine_storm_type(humidity, wind_speed, pressure, coast):
+    """Determine the type of storm based on conditions"""
+    if wind_speed > 25 and pressure < 990:
+        return "Severe Cyclonic Storm"
+    elif wind_speed > 17 and pressure < 1000:
+        return "Tropical Storm"
+    elif wind_speed > 12 and humidity > 85:
+        return "Thunderstorm with Heavy Rain"
+    elif humidity > 80 and wind_speed > 8:
+        return "Moderate Thunderstorm"
+    else:
+        return "Light Rain Showers"
+
+
+def determine_rainfall_type(humidity, wind_speed):
+    """Determine rainfall intensity"""
+    if humidity > 90 and wind_speed > 15:
+        return "Heavy to Very Heavy Rain (115-204 mm)"
+    elif humidity > 85 and wind_speed > 10:
+        return "Heavy Rain (64.5-115.5 mm)"
+    elif humidity > 75 and wind_speed > 7:
+        return "Moderate Rain (35.5-64.4 mm)"
+    elif humidity > 65:
+        return "Light Rain (2.5-15.5 mm)"
+    else:
+        return "Very Light Rain (<2.5 mm)"
+
+
+# Probability bands as (coast, risk level, humidity >=, wind >=, cap, humidity, wind, pressure coefficients),
+# in the order assess_risk tests them. Every band has the form
+#     min(cap, int(humidity * a + wind_speed * b + (1010 - pressure) * c))
+# and adding a zero pressure term leaves the float result bit-for-bit unchanged.
+PROBABILITY_BANDS = (
+    ('East Coast', 'Critical', 85, 12, 95, 0.6, 3.5, 0.5),
+    ('East Coast', 'High', 75, 8, 70, 0.4, 2.5, 0.0),
+    ('East Coast', 'Moderate', 65, 5, 45, 0.3, 1.5, 0.0),
+    ('East Coast', 'Low', None, None, 25, 0.2, 0.8, 0.0),
+    ('West Coast', 'High', 90, 15, 85, 0.5, 3, 0.4),
+    ('West Coast', 'Moderate', 80, 10, 60, 0.35, 2, 0.0),
+    ('West Coast', 'Low', 70, 6, 35, 0.25, 1.2, 0.0),
+    ('West Coast', 'Very Low', None, None, 15, 0.15, 0.5, 0.0),
+)
+
+_BAND_CAP = np.array([band[4] for band in PROBABILITY_BANDS], dtype=np.float64)
+_BAND_A, _BAND_B, _BAND_C = (np.array(column, dtype=np.float64) for column in zip(*(band[5:] for band in PROBABILITY_BANDS)))
+_BAND_LEVEL = np.array([band[1] for band in PROBABILITY_BANDS], dtype=object)
+_BAND_COLOR = np.array(
+    [WEST_LOW_COLOR if band[:2] == ('West Coast', 'Low') else ALERT_COLORS[band[1]] for band in PROBABILITY_BANDS],
+    dtype=object
+)
+_STORM_TYPES = np.array(STORM_TYPES, dtype=object)
+_RAINFALL_TYPES = np.array(RAINFALL_TYPES, dtype=object)
+
+
+def _first_match(conditions, shape):
+    """Index of the first true condition per element (len(conditions) if none), like an if/elif chain"""
+    codes = np.full(shape, len(conditions), dtype=np.uint8)
+    for i in range(len(conditions) - 1, -1, -1):
+        codes[conditions[i]] = i
+    return codes
+
+
+def score_batch(humidity, wind_speed, pressure, coast):
+    """
+    Score many locations at once without per-point branching.
+
+    humidity, wind_speed and pressure are equal-length arrays; coast is a single
+    label or an array of labels. Returns arrays of probability, risk_level,
+    alert_color, storm_type and rainfall_type that match assess_risk,
+    determine_storm_type and determine_rainfall_type point for point.
+    """
+    h = np.asarray(humidity, dtype=np.float64)
+    w = np.asarray(wind_speed, dtype=np.float64)
+    p = np.asarray(pressure, dtype=np.float64)
+    east = np.broadcast_to(np.asarray(coast) == 'East Coast', h.shape)
+
+    east_band = _first_match([(h >= lo_h) & (w >= lo_w) for _, _, lo_h, lo_w, *_ in PROBABILITY_BANDS[:3]], h.shape)
+    west_band = _first_match([(h >= lo_h) & (w >= lo_w) for _, _, lo_h, lo_w, *_ in PROBABILITY_BANDS[4:7]], h.shape)
+    band = np.where(east, east_band, west_band + np.uint8(4))
+
+    probability = np.minimum(
+        _BAND_CAP[band],
+        np.trunc(h * _BAND_A[band] + w * _BAND_B[band] + (1010 - p) * _BAND_C[band])
+    ).astype(np.int64)
+
+    storm_code = _first_match([
+        (w > 25) & (p < 990),
+        (w > 17) & (p < 1000),
+        (w > 12) & (h > 85),
+        (h > 80) & (w > 8),
+    ], h.shape)
+
+    rainfall_code = _first_match([
+        (h > 90) & (w > 15),
+        (h > 85) & (w > 10),
+        (h > 75) & (w > 7),
+        h > 65,
+    ], h.shape)
+
+    return {
+        'probability': probability,
+        'risk_level': _BAND_LEVEL[band],
+        'alert_color': _BAND_COLOR[band],
+        'storm_type': _STORM_TYPES[storm_code],
+        'rainfall_type': _RAINFALL_TYPES[rainfall_code],
+    }
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[Any], Optional[Tuple[Mapping, Mapping]]]
+
+
+def weather_version(weather: Mapping) -> str:
+    """Short fingerprint of a weather observation; changes only when the data does"""
+    payload = json.dumps(dict(weather), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+class Subscription:
+    """One client's view of a city topic: yields encoded server-sent events"""
+
+    def __init__(self, topic: '_Topic', heartbeat: float):
+        self.topic = topic
+        self.heartbeat = heartbeat
+        # Only the latest event matters, so a slow client never queues stale snapshots
+        self.queue = queue.Queue(maxsize=1)
+        self.closed = False
+
+    def offer(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(message)
+
+    def __iter__(self) -> Iterator[str]:
+        while not self.closed:
+            try:
+                yield self.queue.get(timeout=self.heartbeat)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+
+    def close(self) -> None:
+        self.closed = True
+        self.topic.unsubscribe(self)
+
+
+class _Topic:
+    def __init__(self, broadcaster: 'StormBroadcaster', city):
+        self.broadcaster = broadcaster
+        self.city = city
+        self.subscribers = set()
+        self.version = None
+        self.message = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def subscribe(self, heartbeat: float) -> Subscription:
+        subscription = Subscription(self, heartbeat)
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.message is not None:
+                subscription.offer(self.message)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=f'storm-stream-{self.city.name}', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscribers.discard(subscription)
+            if not self.subscribers:
+                self.wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self.refresh()
+            self.wake.wait(self.broadcaster.interval)
+            self.wake.clear()
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+
+    def refresh(self) -> None:
+        """Load the city once for all subscribers and push only if the weather changed"""
+        try:
+            result = self.broadcaster.load(self.city)
+        except Exception as e:
+            logger.warning("Error refreshing storm stream for %s: %s", self.city.name, e)
+            return
+        if not result:
+            return
+        weather, storm = result
+        version = weather_version(weather)
+        if version == self.version:
+            return
+
+        data = json.dumps({'city': self.city.name, 'version': version, 'weather': dict(weather), 'storm': dict(storm)})
+        message = f"id: {version}\nevent: storm\ndata: {data}\n\n"
+        with self.lock:
+            self.version = version
+            self.message = message
+            subscribers = list(self.subscribers)
+        self.broadcaster.published += 1
+        for subscription in subscribers:
+            subscription.offer(message)
+
+
+class StormBroadcaster:
+    """
+    Fans storm snapshots out to server-sent-event subscribers.
+
+    Each city with at least one subscriber has a single refresher thread that
+    calls load(city) every interval seconds and encodes the snapshot once; it is
+    only pushed when the underlying weather has changed. Refreshers stop when
+    their last subscriber disconnects. Every open stream holds a server thread,
+    so at most max_subscribers (0 for no limit) are served at once.
+    """
+
+    def __init__(self, load: Loader, interval: float = 60, heartbeat: float = 15, max_subscribers: int = 0):
+        self.load = load
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self.published = 0
+        self._topics: Dict[str, _Topic] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, city) -> Optional[Subscription]:
+        """A new subscription to city, or None when max_subscribers streams are already open"""
+        with self._lock:
+            if self.max_subscribers and sum(len(t.subscribers) for t in self._topics.values()) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            topic = self._topics.get(city.name)
+            if topic is None:
+                topic = self._topics[city.name] = _Topic(self, city)
+            return topic.subscribe(self.heartbeat)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            topics = list(self._topics.values())
+        return {
+            'published': self.published,
+            'rejected': self.rejected,
+            'max_subscribers': self.max_subscribers,
+            'subscribers': {topic.city.name: len(topic.subscribers) for topic in topics if topic.subscribers}
+        }
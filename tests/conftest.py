@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Keep the app's stores out of the working tree when tests import newww
+_workdir = tempfile.mkdtemp(prefix='storm-tests-')
+os.environ.setdefault('SHELTER_STORE_PATH', os.path.join(_workdir, 'shelters.db'))
+os.environ.setdefault('SHELTER_INDEX_PATH', os.path.join(_workdir, 'shelter_index.json.gz'))
+os.environ.setdefault('CITY_SHELTER_INDEX_PATH', os.path.join(_workdir, 'city_shelter_index.json.gz'))
+os.environ.setdefault('OBSERVATION_STORE_PATH', '')
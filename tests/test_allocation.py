@@ -0,0 +1,42 @@
+import numpy as np
+
+from allocation import allocate
+
+
+def test_people_spill_over_to_the_next_nearest_shelter():
+    # One cell of 500 people; shelters 1, 2 and 3 km east holding 200, 250 and 1000
+    result = allocate([0.0], [0.0], [500], [0.0, 0.0, 0.0], [0.009, 0.018, 0.027], [200, 250, 1000])
+
+    assignments = sorted(zip(result.shelter.tolist(), result.people.tolist()))
+    assert assignments == [(0, 200), (1, 250), (2, 50)]
+    assert result.load.tolist() == [200, 250, 50]
+    assert result.unassigned.tolist() == [0]
+    assert result.summary()['assigned'] == 500
+
+
+def test_capacity_is_never_exceeded_and_leftovers_are_reported():
+    rng = np.random.default_rng(7)
+    cell_lats, cell_lons = rng.uniform(12.9, 13.2, 200), rng.uniform(80.1, 80.3, 200)
+    population = rng.integers(50, 400, 200)
+    shelter_lats, shelter_lons = rng.uniform(12.9, 13.2, 30), rng.uniform(80.1, 80.3, 30)
+    capacity = rng.integers(100, 1500, 30)
+
+    result = allocate(cell_lats, cell_lons, population, shelter_lats, shelter_lons, capacity, k=4)
+
+    assert (result.load <= capacity).all()
+    assert np.bincount(result.shelter, weights=result.people, minlength=30).tolist() == result.load.tolist()
+    assigned = np.bincount(result.cell, weights=result.people, minlength=200)
+    assert (assigned + result.unassigned).tolist() == population.tolist()
+    # Demand exceeds capacity here, so every shelter ends up full
+    assert population.sum() > capacity.sum()
+    assert result.load.tolist() == capacity.tolist()
+    assert result.unassigned.sum() == population.sum() - capacity.sum()
+
+
+def test_shelters_beyond_the_distance_limit_are_not_used():
+    result = allocate([0.0], [0.0], [100], [0.0, 0.0], [0.009, 0.9], [40, 1000], max_distance_km=10)
+
+    assert result.shelter.tolist() == [0]
+    assert result.people.tolist() == [40]
+    assert result.unassigned.tolist() == [60]
+    assert result.load.tolist() == [40, 0]
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def failing():
+    raise RuntimeError('upstream down')
+
+
+def test_concurrent_misses_share_one_load():
+    ttl_cache = TTLCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ttl_cache.get('k', loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while not ttl_cache._inflight:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ['value'] * 8
+    assert ttl_cache.stats()['upstream_loads'] == 1
+
+
+def test_stale_entry_is_served_only_within_max_stale(clock):
+    ttl_cache = TTLCache(ttl=10, max_stale=20)
+    assert ttl_cache.get('k', lambda: 'old') == 'old'
+
+    clock[0] += 15
+    assert ttl_cache.get('k', lambda: None) == 'old'
+    assert ttl_cache.stats()['stale_hits'] == 1
+
+    clock[0] += 20
+    assert ttl_cache.get('k', failing) is None
+
+
+def test_failed_load_falls_back_only_within_max_stale(clock):
+    ttl_cache = TTLCache(ttl=10, max_stale=20)
+    ttl_cache.put('k', 'old')
+
+    clock[0] += 25
+    assert ttl_cache._load('k', failing) is None
+    assert ttl_cache._usable('k') == 'old'
+
+    clock[0] += 10
+    assert ttl_cache._usable('k') is None
+
+
+def test_refresh_reports_failure_instead_of_the_old_value(clock):
+    ttl_cache = TTLCache(ttl=10, max_stale=20)
+    ttl_cache.put('k', 'old')
+    assert ttl_cache.refresh('k', failing) is None
+    assert ttl_cache.refresh('k', lambda: 'new') == 'new'
+    assert ttl_cache.stats()['load_errors'] == 1
+
+
+def test_entry_ttl_is_dropped_with_the_entry(clock):
+    ttl_cache = TTLCache(ttl=100, max_entries=1)
+    ttl_cache.get('empty', lambda: [], entry_ttl=lambda value: None if value else 5)
+    clock[0] += 6
+    assert ttl_cache.fresh('empty') is None
+
+    ttl_cache.put('other', 'x')
+    ttl_cache.put('empty', [1])
+    clock[0] += 6
+    assert ttl_cache.fresh('empty') == [1]
+    assert ttl_cache.ttl_overrides == {}
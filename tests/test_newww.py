@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+import pytest
+
+import newww
+from geo import haversine_many
+from spatial_index import ShelterIndex
+from weather_poller import WeatherPoller
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    newww.weather_cache.clear()
+    newww.nearest_cache.clear()
+    yield
+    newww.weather_cache.clear()
+    newww.nearest_cache.clear()
+
+
+def test_poller_keeps_the_last_snapshot_when_weather_fails(monkeypatch):
+    weather = {'city': 'Chennai', 'temp': 30, 'humidity': 80, 'pressure': 1000, 'wind_speed': 5, 'observed_at': 1}
+    monkeypatch.setattr(newww, 'fetch_weather', lambda city, lat, lon: dict(weather))
+    monkeypatch.setattr(newww, 'get_forecast', lambda city, lat, lon: None)
+    poller = WeatherPoller(lambda: [('Chennai', 'East Coast', 13.08, 80.27)], newww.build_snapshot, interval=60)
+    poller.poll_once()
+    first = poller.get('Chennai')
+    assert first is not None
+
+    def down(city, lat, lon):
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(newww, 'fetch_weather', down)
+    poller.poll_once()
+    assert poller.failures == 1
+    assert poller.get('Chennai').updated_at == first.updated_at
+
+
+def test_expired_shelters_are_served_while_one_refresh_runs(monkeypatch):
+    lat, lon = 11.5, 79.5
+    newww.shelter_store.put(lat, lon, newww.SHELTER_RADIUS_KM, [{'name': 'Old', 'lat': lat, 'lon': lon}], ttl=-1)
+    fetches = []
+
+    def down(lat, lon):
+        fetches.append((lat, lon))
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(newww, 'fetch_shelters', down)
+    for _ in range(5):
+        assert newww.get_shelters('Test', lat, lon)[0]['name'] == 'Old'
+    deadline = time.monotonic() + 5
+    while not fetches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+    # One refresh was attempted; the failure left the entry stamped with the backoff
+    assert len(fetches) == 1
+    assert newww.shelter_store.get(lat, lon, newww.SHELTER_RADIUS_KM)[0]['name'] == 'Old'
+
+
+class CountingFinder:
+    """Overpass stand-in answering from an in-memory index and counting upstream queries"""
+
+    def __init__(self, shelters):
+        self.index = None
+        self.shelters = ShelterIndex(shelters)
+        self.queries = 0
+
+    def nearest_shelters(self, lat, lon, k=5, radius_km=10):
+        self.queries += 1
+        return [dict(shelter) for _, shelter in self.shelters.nearest(lat, lon, k=k, max_distance_km=radius_km)]
+
+
+def brute_force_nearest(shelters, lat, lon, k):
+    distances = haversine_many(lat, lon, [s['lat'] for s in shelters], [s['lon'] for s in shelters])
+    return [shelters[i]['name'] for i in np.argsort(distances)[:k] if distances[i] <= newww.NEAREST_RADIUS_KM]
+
+
+@pytest.mark.parametrize('count, spread', [(150, 0.02), (6000, 0.15)])
+def test_nearest_shelters_match_brute_force(monkeypatch, count, spread):
+    rng = np.random.default_rng(count)
+    shelters = [{'name': f"s{i}", 'lat': 13.08 + rng.normal(0, spread), 'lon': 80.27 + rng.normal(0, spread)}
+                for i in range(count)]
+    # A lone shelter near a cell corner, closer to its users than anything around the crowded centre
+    shelters.append({'name': 'corner', 'lat': 13.1056, 'lon': 80.2947})
+    finder = CountingFinder(shelters)
+    monkeypatch.setattr(newww, 'shelter_finder', finder)
+
+    cells = set()
+    for _ in range(300):
+        lat, lon = 13.08 + rng.uniform(-0.2, 0.2), 80.27 + rng.uniform(-0.2, 0.2)
+        k = int(rng.integers(1, newww.NEAREST_MAX_K + 1))
+        cell, found = newww.get_nearest_shelters(lat, lon, k)
+        assert [s['name'] for s in found] == brute_force_nearest(shelters, lat, lon, k)
+        cells.add(cell)
+    # Nearly every lookup is answered from its coarse cell's cached candidates
+    assert finder.queries <= len(cells) * 1.2
+
+
+def test_risk_tiles_are_served_from_the_grid_built_by_the_poller(monkeypatch):
+    weather = {'humidity': 90, 'wind_speed': 20, 'pressure': 990, 'observed_at': 1}
+    monkeypatch.setattr(newww, 'risk_grid', None)
+    monkeypatch.setattr(newww, 'fetch_weather', lambda city, lat, lon: dict(weather, city=city))
+    monkeypatch.setattr(newww, 'get_forecast', lambda city, lat, lon: None)
+    poller = WeatherPoller(newww.iter_cities, newww.build_snapshot, interval=60,
+                           on_round=newww.update_risk_grid_from_poller)
+    monkeypatch.setattr(newww, 'weather_poller', poller)
+
+    def unexpected():
+        raise AssertionError('requests must not build the grid')
+
+    monkeypatch.setattr(newww, 'current_risk_stations', unexpected)
+    client = newww.app.test_client()
+    assert client.get('/api/risk/point?lat=13.08&lon=80.27').status_code == 503
+
+    poller.poll_once()
+    assert client.get('/tiles/risk/5/22/14.png').status_code == 200
+    assert client.get('/api/risk/point?lat=13.08&lon=80.27').get_json()['probability'] > 0
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+from observation_store import ObservationStore
+
+
+def observation(n):
+    return {'temp': 20.0 + n, 'humidity': 50.0 + n, 'pressure': 1000.0 + n}
+
+
+def test_append_recovers_from_a_partial_write(tmp_path):
+    store = ObservationStore(str(tmp_path))
+    assert store.append('Chennai', observation(0), ts=0)
+
+    # A writer killed after ts.bin and temp.bin, before the remaining columns
+    chunk = store._chunk_dir('Chennai', '1970-01')
+    for column, value, dtype in (('ts', 600, np.int64), ('temp', 21.0, np.float32)):
+        with open(os.path.join(chunk, f'{column}.bin'), 'ab') as f:
+            f.write(np.array([value], dtype=dtype).tobytes())
+
+    assert store.append('Chennai', observation(2), ts=1200)
+    data = store.scan('Chennai', 0, 3600)
+    assert data['ts'].tolist() == [0, 1200]
+    assert data['humidity'].tolist() == [50.0, 52.0]
+    assert data['temp'].tolist() == [20.0, 22.0]
+
+
+def test_append_drops_a_torn_row(tmp_path):
+    store = ObservationStore(str(tmp_path))
+    assert store.append('Chennai', observation(0), ts=0)
+
+    # Half of a timestamp made it to disk
+    chunk = store._chunk_dir('Chennai', '1970-01')
+    with open(os.path.join(chunk, 'ts.bin'), 'ab') as f:
+        f.write(b'\x00' * 4)
+
+    assert store.append('Chennai', observation(1), ts=600)
+    assert not store.append('Chennai', observation(1), ts=600)
+    data = store.scan('Chennai', 0, 3600, ['pressure'])
+    assert data['ts'].tolist() == [0, 600]
+    assert data['pressure'].tolist() == [1000.0, 1001.0]
@@ -0,0 +1,26 @@
+import pytest
+
+from shelter_finder import ShelterFinder, parse_capacity
+
+
+@pytest.mark.parametrize('text, expected', [
+    (300, (300, 300)),
+    ('450', (450, 450)),
+    ('1,200', (1200, 1200)),
+    ('1 200 people', (1200, 1200)),
+    ('12_000', (12000, 12000)),
+    ('300-800 people', (300, 800)),
+    ('300 – 800', (300, 800)),
+    ('1,000-2,500', (1000, 2500)),
+    ('~200', (200, 200)),
+    ('200, 50 beds', (200, 200)),
+    ('unknown', None),
+    ('', None),
+])
+def test_parse_capacity(text, expected):
+    assert parse_capacity(text) == expected
+
+
+def test_build_shelter_keeps_thousands_in_capacity():
+    shelter = ShelterFinder(client=object()).build_shelter({'amenity': 'school', 'capacity': '1,200'}, 13.0, 80.0)
+    assert (shelter['capacity_min'], shelter['capacity_max']) == (1200, 1200)
@@ -0,0 +1,124 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import snapshot_store
+from snapshot_store import SharedSnapshotStore, SnapshotReader
+
+
+@pytest.fixture
+def name():
+    name = f"test_snapshots_{uuid.uuid4().hex[:12]}"
+    yield name
+    try:
+        SharedSnapshotStore.attach(name).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def payload(n):
+    return {'written_at': time.time(), 'n': n, 'cities': {f"city{i}": n for i in range(200)}}
+
+
+def test_read_returns_latest_and_reuses_decoded_payload(name):
+    writer = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    reader = SharedSnapshotStore.attach(name)
+    assert reader.read() is None
+
+    assert writer.write(payload(1)) == 1
+    first = reader.read()
+    assert first['n'] == 1
+    assert reader.read() is first
+
+    assert writer.write(payload(2)) == 2
+    assert reader.read()['n'] == 2
+
+
+def test_read_retries_when_the_slot_is_rewritten_under_it(name, monkeypatch):
+    writer = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    reader = SharedSnapshotStore.attach(name)
+    writer.write(payload(1))
+
+    loads = snapshot_store.marshal.loads
+    calls = []
+
+    def lapped_loads(data):
+        calls.append(1)
+        if len(calls) == 1:
+            # The writer starts two more writes while the reader decodes, so the slot is reused
+            writer.write(payload(2))
+            writer.write(payload(3))
+        return loads(data)
+
+    monkeypatch.setattr(snapshot_store.marshal, 'loads', lapped_loads)
+    assert reader.read()['n'] == 3
+    assert len(calls) == 2
+
+
+def test_concurrent_reads_never_see_a_torn_payload(name):
+    writer = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    reader = SharedSnapshotStore.attach(name)
+    writer.write(payload(0))
+    done = threading.Event()
+    torn = []
+
+    def read_loop():
+        while not done.is_set():
+            data = reader.read()
+            if len(set(data['cities'].values())) != 1 or data['n'] not in data['cities'].values():
+                torn.append(data)
+
+    thread = threading.Thread(target=read_loop)
+    thread.start()
+    for n in range(1, 2000):
+        writer.write(payload(n))
+    done.set()
+    thread.join()
+    assert not torn
+
+
+def test_oversized_payload_is_rejected_and_keeps_the_last_version(name):
+    writer = SharedSnapshotStore.create(name, slot_size=1024)
+    writer.write(payload(0) | {'cities': {}})
+    with pytest.raises(ValueError):
+        writer.write(payload(1))
+    assert writer.version == 1
+    assert SharedSnapshotStore.attach(name).read()['n'] == 0
+
+
+def test_close_keeps_the_segment_for_a_restarted_writer(name):
+    writer = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    writer.write(payload(1))
+    writer.close()
+
+    assert SharedSnapshotStore.attach(name).read()['n'] == 1
+    restarted = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    assert restarted.write(payload(2)) == 2
+
+
+def test_reader_reattaches_when_the_segment_is_replaced(name):
+    old = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    old.write(payload(1))
+    reader = SnapshotReader(name, max_age=0.2, retry_interval=0)
+    assert reader.get('city0') == 1
+
+    # A new writer recreates the segment; the reader still maps the old one
+    old.unlink()
+    new = SharedSnapshotStore.create(name, slot_size=64 * 1024)
+    new.write(payload(2))
+    assert reader.get('city0') == 1
+
+    time.sleep(0.3)
+    new.write(payload(3))
+    assert reader.get('city0') == 3
+
+
+def test_reader_waits_for_the_segment(name):
+    reader = SnapshotReader(name, retry_interval=0)
+    assert reader.get('city0') is None
+    assert reader.stats()['attached'] is False
+
+    SharedSnapshotStore.create(name, slot_size=64 * 1024).write(payload(1))
+    assert reader.get('city0') == 1
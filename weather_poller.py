@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Iterable, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CitySnapshot:
+    """Read-only weather and storm assessment for one city"""
+    city: str
+    coast: str
+    weather: Mapping[str, Any]
+    storm: Mapping[str, Any]
+    updated_at: float
+
+
+class WeatherPoller:
+    """
+    Polls every configured city on a fixed interval and publishes immutable
+    snapshots that request handlers only ever read.
+
+    locations() returns (city, coast, lat, lon) tuples and load(city, coast, lat, lon)
+    returns a (weather, storm) pair or None on failure. A failed load keeps the
+    previous snapshot for that city. mode is 'thread' (a thread pool) or 'asyncio'
+    (an event loop driving the loads concurrently). Snapshots older than max_age
+    seconds (three intervals by default) are not served, so an upstream outage
+    falls back to the caller's own path instead of showing old conditions.
+    on_round(poller), when given, runs after every published round, for work
+    derived from the whole set of snapshots.
+    """
+
+    def __init__(self, locations: Callable[[], Iterable[Tuple[str, str, float, float]]],
+                 load: Callable[[str, str, float, float], Optional[Tuple[Mapping, Mapping]]],
+                 interval: float = 300, max_workers: int = 8, mode: str = 'thread',
+                 max_age: Optional[float] = None, on_round: Optional[Callable[['WeatherPoller'], None]] = None):
+        if mode not in ('thread', 'asyncio'):
+            raise ValueError(f"Unknown poller mode: {mode}")
+        self.locations = locations
+        self.load = load
+        self.interval = interval
+        self.max_workers = max_workers
+        self.mode = mode
+        self.max_age = max_age if max_age is not None else 3 * interval
+        self.on_round = on_round
+
+        self._snapshots = MappingProxyType({})
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+        self.rounds = 0
+        self.failures = 0
+        self.last_round_seconds = 0.0
+
+    def get(self, city: str) -> Optional[CitySnapshot]:
+        """The city's snapshot, or None if there is none younger than max_age"""
+        snapshot = self._snapshots.get(city)
+        if snapshot is None or time.time() - snapshot.updated_at > self.max_age:
+            return None
+        return snapshot
+
+    def stale(self) -> int:
+        """Number of cities whose snapshot is older than max_age"""
+        now = time.time()
+        return sum(1 for snapshot in self._snapshots.values() if now - snapshot.updated_at > self.max_age)
+
+    def snapshots(self) -> Mapping[str, CitySnapshot]:
+        """The current snapshot map; it is replaced, never modified, on each round"""
+        return self._snapshots
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='weather-poller')
+        target = self._run_threaded if self.mode == 'thread' else self._run_asyncio
+        self._thread = threading.Thread(target=target, name='weather-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def poll_once(self) -> None:
+        """Refresh every city once, blocking until the round is published"""
+        locations = list(self.locations())
+        started = time.monotonic()
+        if self._executor is None:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(self._load_one, locations))
+        else:
+            results = list(self._executor.map(self._load_one, locations))
+        self._publish(results, time.monotonic() - started)
+
+    def _run_threaded(self) -> None:
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval)
+
+    def _run_asyncio(self) -> None:
+        asyncio.run(self._poll_forever())
+
+    async def _poll_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            locations = list(self.locations())
+            started = time.monotonic()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(self._executor, self._load_one, location) for location in locations)
+            )
+            self._publish(results, time.monotonic() - started)
+            await loop.run_in_executor(None, self._stop.wait, self.interval)
+
+    def _load_one(self, location: Tuple[str, str, float, float]) -> Optional[CitySnapshot]:
+        city, coast, lat, lon = location
+        try:
+            result = self.load(city, coast, lat, lon)
+        except Exception as e:
+            logger.warning("Error polling weather for %s: %s", city, e)
+            result = None
+        if not result:
+            return None
+        weather, storm = result
+        return CitySnapshot(
+            city=city,
+            coast=coast,
+            weather=MappingProxyType(dict(weather)),
+            storm=MappingProxyType(dict(storm)),
+            updated_at=time.time()
+        )
+
+    def _publish(self, results, elapsed: float) -> None:
+        snapshots = dict(self._snapshots)
+        for snapshot in results:
+            if snapshot is None:
+                self.failures += 1
+            else:
+                snapshots[snapshot.city] = snapshot
+        self._snapshots = MappingProxyType(snapshots)
+        self.rounds += 1
+        self.last_round_seconds = elapsed
+        if self.on_round is not None:
+            try:
+                self.on_round(self)
+            except Exception as e:
+                logger.warning("Error in poller round callback: %s", e)